@@ -0,0 +1,119 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime as dt
+from pathlib import Path
+
+from run import compare
+
+# Statements timed in a fresh interpreter, from the bare package to the classes
+# that load the processing dependencies
+TARGETS = {
+    "package": "import jp_imports",
+    "JPTrade": "from jp_imports import JPTrade",
+    "QueryService": "from jp_imports import QueryService",
+}
+
+
+def importtime(statement: str) -> dict[str, int]:
+    """
+    Runs ``statement`` under ``python -X importtime`` and returns the cumulative
+    import time of every module it loaded, in microseconds.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # Nested imports keep their indentation, top-level ones have none
+        modules[name[1:].rstrip()] = int(cumulative)
+    return modules
+
+
+def measure(statement: str, repeat: int, top: int) -> dict:
+    """Times ``statement`` and lists the heaviest top-level imports of a run."""
+    runs = [importtime(statement) for _ in range(repeat)]
+    totals = [
+        sum(us for name, us in modules.items() if not name.startswith(" "))
+        for modules in runs
+    ]
+    heaviest = sorted(
+        (
+            (name, us)
+            for name, us in runs[totals.index(min(totals))].items()
+            if not name.startswith(" ")
+        ),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return {
+        "seconds": statistics.median(totals) / 1e6,
+        "min_seconds": min(totals) / 1e6,
+        "modules": max(len(modules) for modules in runs),
+        "heaviest": dict(heaviest[:top]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the import time of the jp_imports package."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports kept")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent / "results",
+        help="directory the results are stored in",
+    )
+    parser.add_argument("--baseline", type=Path, help="results file to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="slowdown ratio reported as a regression",
+    )
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": dt.now().isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    for name, statement in TARGETS.items():
+        result = measure(statement, args.repeat, args.top)
+        results["results"][f"import/{name}"] = result
+        heaviest = ", ".join(
+            f"{module} {us / 1e3:.0f}ms" for module, us in result["heaviest"].items()
+        )
+        print(
+            f"{'import/' + name:<32} {result['seconds']:>9.4f}s "
+            f"{result['modules']:>6} modules  {heaviest}"
+        )
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    path = args.output / f"importtime-{dt.now():%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {path}")
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime as dt
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+import polars as pl
+
+from jp_imports import JPTrade
+from jp_imports.jp_imports import LEVEL_GROUPS, TIME_GROUPS
+from jp_imports.profiling import PeakMemory
+
+from synthetic import write_raw
+
+
+def measure(func: Callable[[], pl.DataFrame | pl.LazyFrame], repeat: int) -> dict:
+    """Times ``func`` and records the peak memory it allocates on top of the start."""
+    seconds = []
+    peak = 0
+    for _ in range(repeat):
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            df = func()
+            if isinstance(df, pl.LazyFrame):
+                df = df.collect()
+            seconds.append(time.perf_counter() - start)
+        peak = max(peak, memory.peak_mb)
+        rows = df.height
+        del df
+    return {
+        "seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "peak_mb": peak,
+        "rows": rows,
+    }
+
+
+def cases(trade: JPTrade) -> dict[str, Callable[[], pl.DataFrame | pl.LazyFrame]]:
+    """
+    Builds the benchmarked calls. The stages run on the eager ``jp`` data, which
+    has every level column, and ``process_int_jp`` runs end to end on the lazy
+    scan of the raw partitions.
+    """
+    raw = trade.scan_int(source="jp").collect()
+    converted = trade.conversion(raw)
+
+    benchmarks = {
+        "corrections": lambda: trade.corrections(raw),
+        "conversion": lambda: trade.conversion(raw),
+    }
+    for time_frame in TIME_GROUPS:
+        for level in LEVEL_GROUPS:
+            shape = f"{time_frame}-{level}"
+            keys = TIME_GROUPS[time_frame] + LEVEL_GROUPS[level]
+            benchmarks[f"filter_data/{shape}"] = lambda keys=keys: trade.filter_data(
+                converted, keys
+            )
+            benchmarks[f"process_data/{shape}"] = (
+                lambda time_frame=time_frame, level=level: trade.process_data(
+                    time_frame=time_frame, level=level, base=converted
+                )
+            )
+            benchmarks[f"process_int_jp/{shape}"] = (
+                lambda time_frame=time_frame, level=level: trade.process_int_jp(
+                    level=level, time_frame=time_frame, source="jp", lazy=True
+                )
+            )
+    benchmarks["process_price"] = lambda: trade.process_price()
+    return benchmarks
+
+
+def package_version(name: str) -> str | None:
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Prints the timings against a baseline and returns the regressed names."""
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["seconds"]
+        ratio = result["seconds"] / before if before else float("inf")
+        flag = " <-" if ratio > threshold else ""
+        print(
+            f"{name:<32} {before:>10.4f} {result['seconds']:>10.4f} {ratio:>7.2f}{flag}"
+        )
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the JPTrade pipeline on synthetic trade data."
+    )
+    parser.add_argument("--rows", type=int, default=20_000, help="rows per month")
+    parser.add_argument("--start-year", type=int, default=2010)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filter", default="", help="only run names containing it")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent / "results",
+        help="directory the results are stored in",
+    )
+    parser.add_argument("--baseline", type=Path, help="results file to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="slowdown ratio reported as a regression",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        years = range(args.start_year, args.start_year + args.years)
+        write_raw(tmp_dir, years, args.rows, seed=args.seed)
+        trade = JPTrade(saving_dir=f"{tmp_dir}/", log_file=f"{tmp_dir}/bench.log")
+
+        results = {
+            "meta": {
+                "timestamp": dt.now().isoformat(timespec="seconds"),
+                "rows_per_month": args.rows,
+                "years": args.years,
+                "repeat": args.repeat,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "polars": pl.__version__,
+                "pr_imports": package_version("pr-imports"),
+                "jp_imports": package_version("jp-imports"),
+            },
+            "results": {},
+        }
+        for name, func in cases(trade).items():
+            if args.filter not in name:
+                continue
+            result = measure(func, args.repeat)
+            results["results"][name] = result
+            print(
+                f"{name:<32} {result['seconds']:>9.4f}s "
+                f"{result['peak_mb']:>9.1f}MB {result['rows']:>10} rows"
+            )
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    path = args.output / f"{dt.now():%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {path}")
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+
+from jp_imports.jp_imports import load_agr_codes
+
+# HS4 headings the codes are drawn from: agricultural products, the spirits with
+# HTS6 specific proof liter factors, and a mix of industrial goods
+HS4_POOL = [
+    "0201", "0207", "0402", "0701", "0803", "1001", "1004", "1006", "1701",
+    "2009", "2106", "2202", "2203", "2207", "2208", "2304", "2710", "2714",
+    "3004", "3822", "8471", "8517", "8703", "9018",
+]  # fmt: skip
+
+# Units of the raw quantity fields, repeated to approximate their frequency
+UNITS = [
+    "kg", "kg", "kg", "kg", "KG", "t", "t", "l", "pfl", "pfl", "doz", "m3",
+    "gm", "no", "x", None,
+]  # fmt: skip
+
+COUNTRIES = [
+    "united states", "china", "mexico", "japan", "canada", "spain", "germany",
+    "ireland", "dominican republic", "colombia", "brazil", "india",
+]  # fmt: skip
+
+
+def hts_codes(count: int, seed: int = 0) -> pl.Series:
+    """Draws ``count`` distinct HTS-10 codes spread over ``HS4_POOL``."""
+    index = pl.int_range(0, count * 4, eager=True)
+    headings = pl.Series(HS4_POOL)
+    codes = pl.select(
+        headings.gather(index % len(HS4_POOL))
+        + (index.hash(seed) % 1_000_000).cast(pl.String).str.zfill(6)
+    ).to_series()
+    return codes.unique(maintain_order=True).head(count).alias("hts_code")
+
+
+def trade_frame(
+    rows: int,
+    year: int,
+    month: int,
+    source: Literal["org", "jp"] = "org",
+    codes: pl.Series | list[str | None] | None = None,
+    seed: int = 0,
+    countries: list[str | None] = COUNTRIES,
+    units: list[str | None] = UNITS,
+    naics: dict[str, str] | None = None,
+) -> pl.DataFrame:
+    """
+    Generates one month of raw trade records shaped like ``inttradedata``
+    (``source="org"``) or ``jptradedata`` (``source="jp"``). The benchmarks and
+    the test fixtures both draw their data from it.
+
+    Args:
+        rows (int): The number of records.
+        year (int): The year of the records.
+        month (int): The month of the records.
+        source (Literal["org", "jp"]): The shape of the records. Defaults to
+            ``"org"``.
+        codes (pl.Series | list[str | None] | None): The HTS-10 codes to draw
+            from, None for records without a code. Defaults to 2,000 codes from
+            ``hts_codes``.
+        seed (int): The random seed. Defaults to 0.
+        countries (list[str | None]): The countries to draw from. Defaults to
+            ``COUNTRIES``.
+        units (list[str | None]): The units to draw from. Defaults to ``UNITS``.
+        naics (dict[str, str] | None): The NAICS code of every HTS chapter of
+            ``codes``. Defaults to a code derived from the chapter.
+
+    Returns:
+        pl.DataFrame: The raw trade records.
+    """
+    if codes is None:
+        codes = hts_codes(2_000)
+    seed = seed * 1_000_003 + year * 12 + month
+
+    def sample(values: list | pl.Series, offset: int) -> pl.Series:
+        return pl.Series(values).sample(rows, with_replacement=True, seed=seed + offset)
+
+    def quantity(offset: int) -> pl.Series:
+        values = pl.int_range(0, rows, eager=True).hash(seed + offset)
+        return (
+            pl.select(
+                pl.when(values % 10 == 0).then(None).otherwise(values % 1_000_000)
+            )
+            .to_series()
+            .cast(pl.Int64)
+        )
+
+    df = pl.DataFrame(
+        {
+            "date": pl.Series([datetime(year, month, 1)] * rows, dtype=pl.Datetime),
+            "country": sample(countries, 1).cast(pl.String),
+            "trade_id": sample([1, 2], 2).cast(pl.Int64),
+            "hts_code": sample(codes, 3).cast(pl.String),
+            "unit_1": sample(units, 4).cast(pl.String),
+            "qty_1": quantity(5),
+            "unit_2": sample(units, 6).cast(pl.String),
+            "qty_2": quantity(7),
+            "data": (pl.int_range(0, rows, eager=True).hash(seed + 8) % 10**7).cast(
+                pl.Int64
+            ),
+        }
+    )
+    return describe(df, source=source, naics=naics)
+
+
+def describe(
+    df: pl.DataFrame,
+    source: Literal["org", "jp"] = "org",
+    naics: dict[str, str] | None = None,
+) -> pl.DataFrame:
+    """
+    Adds the description columns of the raw records to the trade columns of
+    ``df``: the agricultural flag and HTS description, plus the NAICS and SITC
+    codes of ``jptradedata``. ``naics`` is as in ``trade_frame``.
+    """
+    agr_codes = load_agr_codes()["hs4"]
+    df = df.with_columns(
+        agri_prod=pl.col("hts_code")
+        .str.slice(0, 4)
+        .is_in(agr_codes.implode())
+        .cast(pl.Int64),
+        hts_desc=pl.lit("synthetic ") + pl.col("hts_code").str.slice(0, 4),
+    )
+    if source == "jp":
+        chapter = pl.col("hts_code").str.slice(0, 2)
+        df = df.with_columns(
+            naics=pl.lit("3") + pl.col("hts_code").str.slice(1, 2)
+            if naics is None
+            else chapter.replace_strict(naics, default=None),
+            sitc=pl.col("hts_code").str.slice(0, 3),
+        )
+    return df
+
+
+def write_raw(
+    saving_dir: str | Path,
+    years: range,
+    rows_per_month: int,
+    sources: tuple[str, ...] = ("org", "jp"),
+    seed: int = 0,
+) -> Path:
+    """
+    Writes synthetic raw partitions in the ``saving_dir/raw/<source>/YYYY/MM``
+    layout that ``JPTrade.scan_int`` reads, so no data pull is needed.
+
+    Returns:
+        Path: The ``saving_dir``.
+    """
+    saving_dir = Path(saving_dir)
+    codes = hts_codes(max(rows_per_month // 20, 100), seed=seed)
+    for source in sources:
+        for year in years:
+            for month in range(1, 13):
+                path = saving_dir / "raw" / source / str(year) / f"{month:02d}"
+                path.mkdir(parents=True, exist_ok=True)
+                df = trade_frame(rows_per_month, year, month, source, codes, seed)
+                df.write_parquet(path / "data.parquet")
+    return saving_dir
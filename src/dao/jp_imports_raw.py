@@ -1,5 +1,19 @@
+import logging
+import time
+import polars as pl
 from sqlmodel import Field, Session, SQLModel
-from sqlalchemy import BigInteger, Column
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Connection,
+    Engine,
+    Table,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.schema import CreateTable
 from datetime import datetime
 from typing import Optional
 
@@ -78,5 +92,243 @@ def create_trade(engine):
     exports = TradeTable(id=2, trade="Exports")
     hts = HTSTable(id=1, hts_code="N/A", hts_short_desc="N/A", hts_long_desc="N/A", agri_prod=True)
     with Session(engine) as session:
-        session.add_all([imports, exports])
-        session.commit()
\ No newline at end of file
+        # Merged by primary key, so the seed rows can be written to a loaded database
+        for row in [imports, exports, hts]:
+            session.merge(row)
+        session.commit()
+
+def init_trade_tables(engine: Engine) -> None:
+    """Creates the missing tables and seed rows, keeping the loaded data."""
+    if engine.dialect.name == "duckdb":
+        # DuckDB has no SERIAL type, and the loader assigns every id itself
+        with engine.begin() as conn:
+            for table in SQLModel.metadata.sorted_tables:
+                ddl = CreateTable(table, if_not_exists=True).compile(
+                    dialect=engine.dialect
+                )
+                conn.exec_driver_sql(str(ddl).replace(" SERIAL ", " INTEGER "))
+    else:
+        SQLModel.metadata.create_all(engine)
+    create_trade(engine)
+
+# Raw columns stored on the facts as they are
+FACT_COLUMNS = ["date", "trade_id", "data", "qty_1", "qty_2", "end_use_i", "end_use_e"]
+
+# Dimensions resolved by load_trade_data: the table, its natural key, the raw
+# columns holding the key with the foreign key they map to, and the raw columns
+# filling its other fields, "N/A" (or False for flags) when missing as in
+# create_trade
+DIMENSIONS = [
+    (
+        HTSTable,
+        "hts_code",
+        {"hts_code": "hts_id"},
+        {
+            "hts_short_desc": "hts_desc",
+            "hts_long_desc": "hts_desc",
+            "agri_prod": "agri_prod",
+        },
+    ),
+    (CountryTable, "country_name", {"country": "country_id"}, {"cty_code": "cty_code"}),
+    (
+        NAICSTable,
+        "naics_code",
+        {"naics": "naics_id"},
+        {"naics_description": "naics_desc"},
+    ),
+    (
+        SITCTable,
+        "sitc_code",
+        {"sitc": "sitc_id"},
+        {"sitc_short_desc": "sitc_desc", "sitc_long_desc": "sitc_desc"},
+    ),
+    (
+        DistrictTable,
+        "district_code",
+        {"district": "district_id"},
+        {"district_desc": "district_desc"},
+    ),
+    (UnitTable, "unit_code", {"unit_1": "unit1_id", "unit_2": "unit2_id"}, {}),
+]
+
+def load_trade_data(
+    engine: Engine,
+    data: pl.DataFrame,
+    model: type[SQLModel] = IntTradeData,
+    batch_size: int = 100_000,
+) -> dict[str, float]:
+    """
+    Bulk loads raw trade records into the star schema, as the fact table of
+    ``model`` and the dimension tables its foreign keys point to.
+
+    Surrogate keys are resolved per dimension rather than per row: the distinct
+    codes of the load are matched against the dimension table, the missing ones
+    are inserted with new ids, and the raw columns are mapped to ids by
+    encoding them against the distinct codes. Facts are inserted in batches of
+    ``batch_size`` rows with Core ``executemany`` inserts, or as Arrow batches
+    on DuckDB. The months found in ``data`` replace the facts already stored
+    for them in a single transaction, so reloading a month is idempotent and
+    no table is ever dropped.
+
+    New ids follow the largest id stored when the load starts, so loads into
+    one database must not run concurrently: two loads would hand out the same
+    ids and the later one fails on the primary key. Run them one after another.
+
+    Args:
+        engine (Engine): The engine of the database, e.g. SQLite or DuckDB
+            through ``duckdb_engine``.
+        data (pl.DataFrame): Raw trade records shaped like ``inttradedata`` or
+            ``jptradedata``.
+        model (type[SQLModel]): The fact table, ``IntTradeData`` or
+            ``JPTradeData``. Defaults to ``IntTradeData``.
+        batch_size (int): The number of rows per insert. Defaults to 100,000.
+
+    Returns:
+        dict[str, float]: The number of fact ``rows`` loaded, the ``seconds``
+            the load took, and the resulting ``rows_per_sec``.
+    """
+    start = time.perf_counter()
+    init_trade_tables(engine)
+    facts = model.__table__
+    # Recent SQLModel versions store datetime fields as aware UTC timestamps
+    time_zone = "UTC" if facts.c.date.type.timezone else None
+    data = data.with_columns(pl.col("date").cast(pl.Datetime("us", time_zone)))
+
+    with engine.begin() as conn:
+        columns = [
+            pl.col(col)
+            for col in FACT_COLUMNS
+            if col in data.columns and col in facts.c
+        ]
+        for dimension, code_field, keys, fields in DIMENSIONS:
+            keys = {
+                col: fk
+                for col, fk in keys.items()
+                if col in data.columns and fk in facts.c
+            }
+            if not keys:
+                continue
+            codes = resolve_keys(
+                conn, dimension, code_field, data, keys, fields, batch_size
+            )
+            dictionary = pl.Enum(codes[code_field])
+            for col, fk in keys.items():
+                # Dictionary-encoded join: the Enum index of a code is its row in codes
+                index = data[col].cast(pl.String).cast(dictionary).to_physical()
+                columns.append(codes["id"].gather(index).alias(fk))
+        df = data.select(columns)
+
+        months = df.select(start=pl.col("date").dt.truncate("1mo").unique().sort())
+        months = months.with_columns(end=pl.col("start").dt.offset_by("1mo"))
+        for month_start, month_end in months.iter_rows():
+            conn.execute(
+                delete(facts).where(
+                    facts.c.date >= month_start, facts.c.date < month_end
+                )
+            )
+        first_id = (
+            conn.execute(select(func.coalesce(func.max(facts.c.id), 0))).scalar_one()
+            + 1
+        )
+        df = df.with_row_index("id", offset=first_id).with_columns(
+            pl.col("id").cast(pl.Int64)
+        )
+        insert_rows(conn, facts, df, batch_size)
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": df.height,
+        "seconds": seconds,
+        "rows_per_sec": df.height / seconds if seconds else 0.0,
+    }
+    logging.info(
+        f"Loaded {df.height} rows into {facts.name} in {seconds:.2f}s "
+        f"({stats['rows_per_sec']:.0f} rows/sec)"
+    )
+    return stats
+
+def resolve_keys(
+    conn: Connection,
+    model: type[SQLModel],
+    code_field: str,
+    data: pl.DataFrame,
+    keys: dict[str, str],
+    fields: dict[str, str],
+    batch_size: int = 100_000,
+) -> pl.DataFrame:
+    """
+    Returns the ``id`` of every distinct code in the ``keys`` columns of
+    ``data``, inserting the codes missing from the dimension table of ``model``
+    with the ids following the largest stored one, which is only safe while no
+    other load writes the table.
+    """
+    table = model.__table__
+    codes = (
+        pl.concat(
+            [
+                data.select(
+                    pl.col(col).cast(pl.String).alias(code_field),
+                    *(
+                        pl.col(raw).alias(field)
+                        for field, raw in fields.items()
+                        if raw in data.columns
+                    ),
+                )
+                for col in keys
+            ],
+            how="diagonal",
+        )
+        .drop_nulls(code_field)
+        .unique(code_field, keep="first", maintain_order=True)
+    )
+
+    existing = pl.DataFrame(
+        conn.execute(select(table.c[code_field], table.c.id)).all(),
+        schema={code_field: pl.String, "id": pl.Int64},
+        orient="row",
+    ).unique(code_field, keep="first")
+    new = codes.join(existing, on=code_field, how="anti")
+    if not new.is_empty():
+        first_id = (
+            conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar_one()
+            + 1
+        )
+        new = new.with_row_index("id", offset=first_id).with_columns(
+            pl.col("id").cast(pl.Int64),
+            *(
+                pl.lit(None).alias(field)
+                for field in table.c.keys()
+                if field not in new.columns and field != "id"
+            ),
+        )
+        new = new.with_columns(
+            pl.col(field).cast(pl.Boolean).fill_null(False)
+            if table.c[field].type.python_type is bool
+            else pl.col(field).cast(pl.String).fill_null("N/A")
+            for field in table.c.keys()
+            if field not in ("id", code_field)
+        )
+        insert_rows(conn, table, new, batch_size)
+        existing = pl.concat([existing, new.select(code_field, "id")])
+
+    return codes.select(code_field).join(
+        existing, on=code_field, how="left", maintain_order="left"
+    )
+
+def insert_rows(
+    conn: Connection, table: Table, df: pl.DataFrame, batch_size: int = 100_000
+) -> None:
+    """Inserts ``df`` into ``table`` in batches, as Arrow data on DuckDB."""
+    for batch in df.iter_slices(batch_size):
+        if conn.dialect.name == "duckdb":
+            # The DB-API connection of duckdb_engine proxies the DuckDB one
+            raw = conn.connection.dbapi_connection
+            raw.register("load_batch", batch.to_arrow())
+            try:
+                raw.execute(
+                    f'INSERT INTO "{table.name}" BY NAME SELECT * FROM load_batch'
+                )
+            finally:
+                raw.unregister("load_batch")
+        else:
+            conn.execute(insert(table), batch.to_dicts())
@@ -1,6 +1,31 @@
-from .jp_imports import JPTrade
+import importlib
 
-from importlib.metadata import version
+# Not taken from typing, which costs more to import than the package itself
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .cli import main
+    from .jp_imports import JPTrade
+    from .service import QueryService
 
-__version__ = version("jp_imports")
-__all__ = ["JPTrade"]
+# Public names and the submodule defining them, imported on first access so
+# that ``import jp_imports`` does not load Polars, DuckDB, or pr_imports
+_LAZY = {"JPTrade": ".jp_imports", "QueryService": ".service", "main": ".cli"}
+
+__all__ = ["JPTrade", "QueryService", "main"]
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    elif name == "__version__":
+        from importlib.metadata import version
+
+        value = version("jp_imports")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_LAZY, "__version__"])
@@ -0,0 +1,241 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+from .jp_imports import LEVEL_GROUPS, TIME_GROUPS, JPTrade, replace_dir
+
+MANIFEST = "manifest.json"
+
+
+def matrix(args: argparse.Namespace) -> dict[str, dict[str, Any]]:
+    """
+    Expands the command line into the ``process_int_jp`` queries to export,
+    keyed by the name of their output directory. A ``level:prefix`` filter only
+    applies to its level, a bare prefix to the one requested level with a
+    taxonomy column (``parse_args`` rejects it when there are several).
+    """
+    agriculture = {"off": [False], "on": [True], "both": [False, True]}
+    filters = [
+        tuple(item.split(":", 1)) if ":" in item else (None, item)
+        for item in args.filters
+    ]
+    queries = {}
+    combinations = itertools.product(
+        args.levels,
+        args.time_frames,
+        args.datetimes,
+        filters,
+        agriculture[args.agriculture],
+    )
+    for level, time_frame, datetime, scoped, agriculture_filter in combinations:
+        scope, level_filter = scoped
+        if level_filter and (not LEVEL_GROUPS[level] or scope not in (None, level)):
+            continue
+        parts = [args.source, "corrected" if args.corrections else "uncorrected"]
+        parts += [time_frame, level]
+        if level_filter:
+            parts.append(f"f{level_filter}")
+        if datetime:
+            parts.append(f"d{datetime}")
+        if agriculture_filter:
+            parts.append("agri")
+        name = re.sub(r"[^0-9A-Za-z.]+", "_", "-".join(parts).replace("+", "_to_"))
+        queries[name] = {
+            "level": level,
+            "time_frame": time_frame,
+            "datetime": datetime,
+            "level_filter": level_filter,
+            "agriculture_filter": agriculture_filter,
+            "corrections": args.corrections,
+            "source": args.source,
+        }
+    return queries
+
+
+def write_output(df: pl.DataFrame, path: Path, key: str, file_format: str) -> list[str]:
+    """
+    Writes a result partitioned by ``key`` in a hive layout, e.g.
+    ``path/year=2024/data.parquet``, replacing the previous output through
+    ``replace_dir`` so that ``path`` is never missing or partial.
+
+    Returns:
+        list[str]: The written files, relative to ``path``.
+    """
+    staging_dir = path.parent / f".{path.name}-{uuid.uuid4().hex}"
+    files = []
+    for (value,), part in df.partition_by([key], as_dict=True).items():
+        name = f"{key}={value}/data.{file_format}"
+        (staging_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        if file_format == "csv":
+            part.write_csv(staging_dir / name)
+        else:
+            part.write_parquet(staging_dir / name)
+        files.append(name)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+
+    replace_dir(staging_dir, path)
+    return sorted(files)
+
+
+def read_manifest(output: Path) -> dict[str, dict[str, Any]]:
+    path = output / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def write_manifest(output: Path, manifest: dict[str, dict[str, Any]]) -> None:
+    """Replaces the manifest atomically, so an interrupted run keeps its entries."""
+    tmp_path = output / f".{MANIFEST}-{uuid.uuid4().hex}"
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp_path, output / MANIFEST)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="jp-imports",
+        description=(
+            "Export a matrix of process_int_jp aggregations as partitioned files."
+        ),
+    )
+    parser.add_argument("output", type=Path, help="directory the results go to")
+    parser.add_argument(
+        "--levels", nargs="+", choices=list(LEVEL_GROUPS), default=["hts"]
+    )
+    parser.add_argument(
+        "--time-frames", nargs="+", choices=list(TIME_GROUPS), default=["monthly"]
+    )
+    parser.add_argument(
+        "--datetimes",
+        nargs="+",
+        default=[""],
+        help='years ("2024") or ranges ("2024-01-01+2024-06-30"), all by default',
+    )
+    parser.add_argument(
+        "--filters",
+        nargs="+",
+        default=[""],
+        help=(
+            'prefixes of the level codes, e.g. "22" or "hts:22", none by default; '
+            "with several taxonomy levels each prefix needs its level"
+        ),
+    )
+    parser.add_argument(
+        "--agriculture",
+        choices=["off", "on", "both"],
+        default="off",
+        help="run the queries without, with, or both ways of the agri filter",
+    )
+    parser.add_argument("--corrections", action="store_true")
+    parser.add_argument("--source", choices=["org", "jp"], default="org")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="queries run at once"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the outputs already written from the current data",
+    )
+    parser.add_argument("--saving-dir", default="data/")
+    parser.add_argument("--log-file", default="data.log")
+    args = parser.parse_args(argv)
+
+    taxonomies = [level for level in args.levels if LEVEL_GROUPS[level]]
+    for item in args.filters:
+        scope, _, prefix = item.rpartition(":")
+        if scope and scope not in taxonomies:
+            parser.error(f"--filters {item}: {scope} is not a requested taxonomy level")
+        if not scope and prefix and len(taxonomies) > 1:
+            parser.error(
+                f"--filters {item}: prefix the filter with one of "
+                f"{', '.join(taxonomies)}, e.g. {taxonomies[0]}:{prefix}"
+            )
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Runs the ``jp-imports`` command.
+
+    Every combination of the requested levels, time frames, date filters,
+    prefix filters, and agriculture flags is aggregated from one load of the
+    cached base table, on a pool of ``--workers`` threads. Each result is
+    written under ``output/<name>/`` partitioned by its first time key, and
+    recorded in ``output/manifest.json`` with its parameters, files, and the
+    fingerprint of the data it was built from. With ``--resume``, outputs whose
+    fingerprint matches the current data are skipped. Exits with status 1 if a
+    query failed, e.g. on a prefix that matches no code.
+    """
+    args = parse_args(argv)
+    args.output.mkdir(parents=True, exist_ok=True)
+    trade = JPTrade(saving_dir=args.saving_dir, log_file=args.log_file)
+    fingerprint = trade.fingerprint(source=args.source)
+
+    manifest = read_manifest(args.output)
+    queries = matrix(args)
+    total = len(queries)
+    if args.resume:
+        queries = {
+            name: query
+            for name, query in queries.items()
+            if not (
+                manifest.get(name, {}).get("fingerprint") == fingerprint
+                and manifest[name]["format"] == args.format
+                and (args.output / name).exists()
+            )
+        }
+        print(f"Skipping {total - len(queries)} of {total} outputs, up to date")
+    if not queries:
+        return
+
+    base = trade.base_table(source=args.source, corrections=args.corrections)
+    base = base.collect()
+    lock = threading.Lock()
+
+    def export(name: str, query: dict[str, Any]) -> dict[str, Any]:
+        start = time.perf_counter()
+        df = trade.process_int_jp(**query, base=base.lazy())
+        key = TIME_GROUPS[query["time_frame"]][0]
+        files = write_output(df, args.output / name, key, args.format)
+        entry = query | {
+            "format": args.format,
+            "files": files,
+            "rows": df.height,
+            "seconds": time.perf_counter() - start,
+            "fingerprint": fingerprint,
+        }
+        with lock:
+            manifest[name] = entry
+            write_manifest(args.output, manifest)
+        return entry
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(export, name, query): name
+            for name, query in queries.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                entry = future.result()
+            except ValueError as error:
+                failed.append(name)
+                logging.error(f"Export of {name} failed: {error}")
+                print(f"{name:<56} failed: {error}")
+                continue
+            print(f"{name:<56} {entry['rows']:>9} rows {entry['seconds']:>8.2f}s")
+
+    if failed:
+        sys.exit(1)
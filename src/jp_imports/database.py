@@ -0,0 +1,98 @@
+import atexit
+import threading
+from pathlib import Path
+
+import duckdb
+
+
+class ConnectionPool:
+    """
+    Shares DuckDB connections across the package and the DAO layer.
+
+    One database instance is opened per path and every thread gets its own
+    cursor on it, so concurrent callers neither reopen the database file nor
+    share a connection between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._databases: dict[str, tuple[duckdb.DuckDBPyConnection, bool]] = {}
+        self._cursors: dict[str, dict[threading.Thread, duckdb.DuckDBPyConnection]]
+        self._cursors = {}
+
+    def __enter__(self) -> "ConnectionPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def cursor(
+        self, db_path: str | Path = ":memory:", read_only: bool = False
+    ) -> duckdb.DuckDBPyConnection:
+        """
+        Returns the calling thread's cursor on the database at ``db_path``.
+
+        The database is opened on first use. DuckDB does not allow opening the
+        same file with different settings in one process, so a database open
+        read-write also serves read-only requests, while a read-write request on
+        a database open read-only reopens it read-write. The reopening closes the
+        cursors handed out before it, so callers should get a cursor per use
+        rather than keep one. The cursors of threads that have exited are closed
+        as well.
+
+        Args:
+            db_path (str | Path): The path of the DuckDB database file, or
+                ``":memory:"`` for the shared in-memory database. Defaults to
+                ``":memory:"``.
+            read_only (bool): If True, opens the database read-only, as query
+                workers should, unless it is already open read-write. Defaults
+                to False.
+
+        Returns:
+            duckdb.DuckDBPyConnection: A cursor owned by the calling thread. It
+                must not be closed by the caller.
+        """
+        key = str(db_path)
+        # The in-memory database cannot be opened read-only
+        read_only = read_only and key != ":memory:"
+        with self._lock:
+            if key in self._databases and self._databases[key][1] and not read_only:
+                self._close(key)
+            if key not in self._databases:
+                database = duckdb.connect(key, read_only=read_only)
+                self._databases[key] = (database, read_only)
+                self._cursors[key] = {}
+
+            cursors = self._cursors[key]
+            for thread in [thread for thread in cursors if not thread.is_alive()]:
+                cursors.pop(thread).close()
+            thread = threading.current_thread()
+            if thread not in cursors:
+                cursors[thread] = self._databases[key][0].cursor()
+            return cursors[thread]
+
+    def close(self, db_path: str | Path | None = None) -> None:
+        """
+        Closes every cursor and the database instance of ``db_path``, or of all
+        the open databases if no path is given.
+
+        Args:
+            db_path (str | Path | None): The path of the database to close.
+                Defaults to None.
+        """
+        with self._lock:
+            keys = list(self._databases) if db_path is None else [str(db_path)]
+            for key in keys:
+                if key in self._databases:
+                    self._close(key)
+
+    def _close(self, key: str) -> None:
+        """Closes the cursors and the database of ``key``, with the lock held."""
+        for cursor in self._cursors.pop(key).values():
+            cursor.close()
+        database, _ = self._databases.pop(key)
+        database.close()
+
+
+connections = ConnectionPool()
+atexit.register(connections.close)
@@ -0,0 +1,65 @@
+from bisect import bisect_left
+
+import polars as pl
+
+# Sorts after every character a taxonomy code can contain, so that appending it
+# to a prefix gives the upper bound of the codes sharing that prefix
+_PREFIX_END = "\U0010ffff"
+
+
+class PrefixIndex:
+    """
+    Sorted index over the distinct codes of a taxonomy column.
+
+    Prefix lookups are binary searches over the sorted codes, so a prefix is
+    resolved to the codes it matches (and, when the indexed table is sorted by
+    the column, to the contiguous range of rows holding them) without touching
+    the data.
+    """
+
+    def __init__(
+        self,
+        codes: list[str],
+        starts: list[int] | None = None,
+        lengths: list[int] | None = None,
+    ) -> None:
+        self.codes = codes
+        self.starts = starts
+        self.lengths = lengths
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> "PrefixIndex":
+        """
+        Builds the index from a ``code`` column sorted ascending, with optional
+        ``start`` and ``length`` columns giving the rows of each code.
+        """
+        if "start" not in df.columns:
+            return cls(df["code"].to_list())
+        return cls(df["code"].to_list(), df["start"].to_list(), df["length"].to_list())
+
+    def bounds(self, prefix: str) -> tuple[int, int]:
+        """Returns the positions ``[lo, hi)`` of the codes starting with ``prefix``."""
+        lo = bisect_left(self.codes, prefix)
+        hi = bisect_left(self.codes, prefix + _PREFIX_END, lo)
+        return lo, hi
+
+    def __contains__(self, prefix: str) -> bool:
+        lo, hi = self.bounds(prefix)
+        return lo < hi
+
+    def match(self, prefix: str) -> list[str]:
+        """Returns the codes starting with ``prefix``."""
+        lo, hi = self.bounds(prefix)
+        return self.codes[lo:hi]
+
+    def rows(self, prefix: str) -> tuple[int, int] | None:
+        """
+        Returns the ``(offset, length)`` row slice holding the codes starting
+        with ``prefix``, or None when the index has no row offsets or nothing
+        matches.
+        """
+        lo, hi = self.bounds(prefix)
+        if self.starts is None or lo == hi:
+            return None
+        offset = self.starts[lo]
+        return offset, self.starts[hi - 1] + self.lengths[hi - 1] - offset
@@ -1,10 +1,23 @@
+import functools
+import hashlib
 import importlib.resources as resources
+import json
+import logging
+import os
+import shutil
+import uuid
+from collections.abc import Callable, Hashable, Iterable, Mapping
 from datetime import datetime as dt
+from pathlib import Path
 from typing import Literal
 import polars as pl
 
 from pr_imports import TradeUtils
 
+from .database import connections
+from .index import PrefixIndex
+from .profiling import collect, instrumented
+
 LEVEL_GROUPS = {
     "total": [],
     "naics": ["naics"],
@@ -19,6 +32,194 @@ TIME_GROUPS = {
     "monthly": ["year", "month"],
 }
 
+# Bump whenever ``corrections``, ``conversion``, the cube shapes, or the snapshot
+# layout change their output so that previously cached tables are rebuilt.
+BASE_CACHE_VERSION = 7
+
+# Column the rows of the cube are sorted by, so prefix filters on it are slices
+CUBE_SORT_KEY = "hts_code"
+
+# Dtypes of the cached base table, the taxonomy and unit columns have small
+# domains and the trade flag only takes a couple of values
+COMPACT_SCHEMA = {
+    "hts_code": pl.Categorical,
+    "naics": pl.Categorical,
+    "country": pl.Categorical,
+    "unit_1": pl.Categorical,
+    "unit_2": pl.Categorical,
+    "trade_id": pl.Int8,
+}
+
+# Schema metadata key of the snapshot files holding the categories of every
+# categorical column, which is stored as its integer codes
+SNAPSHOT_CATEGORIES = b"jp_imports.categories"
+
+# Raw columns derivable from the HTS code, dropped from the cached base table
+DERIVED_COLUMNS = ["hts_desc", "agri_prod"]
+
+
+def load_unit_factors() -> pl.DataFrame:
+    """
+    Loads the default unit conversion table from ``resources/unit_conversion.json``.
+
+    Each rule converts a unit code to kilograms (or kilogram equivalents) with a
+    factor, optionally only for records of a given HTS6 code. The order of the
+    rules sets the priority of the units when both quantity fields can be
+    converted.
+
+    Returns:
+        pl.DataFrame: A Polars DataFrame with ``unit``, ``hts6``, and ``factor``
+            columns.
+    """
+    path = resources.files("jp_imports").joinpath("resources/unit_conversion.json")
+    return pl.DataFrame(
+        json.loads(path.read_text()),
+        schema={"unit": pl.String, "hts6": pl.String, "factor": pl.Float64},
+    )
+
+
+@functools.cache
+def load_agr_codes() -> pl.DataFrame:
+    """
+    Loads the HS4 codes of agricultural products from ``resources/code_agr.json``
+    once per process.
+
+    Returns:
+        pl.DataFrame: A Polars DataFrame with a zero-padded ``hs4`` column.
+    """
+    path = resources.files("jp_imports").joinpath("resources/code_agr.json")
+    codes = sorted(set(json.loads(path.read_text()).values()))
+    return pl.DataFrame({"hs4": [f"{code:04d}" for code in codes]})
+
+
+@functools.cache
+def load_naics_labels() -> dict[str, str]:
+    """
+    Loads the labels of the NAICS sectors, subsectors, and industry groups from
+    ``resources/code_classification.json`` once per process.
+
+    Returns:
+        dict[str, str]: The label of every NAICS code prefix.
+    """
+    path = resources.files("jp_imports").joinpath("resources/code_classification.json")
+    return json.loads(path.read_text())
+
+
+def load_corrections(path: str | Path | None = None) -> tuple[int, pl.DataFrame]:
+    """
+    Loads a versioned correction rule file, by default
+    ``resources/corrections.json``.
+
+    Each rule replaces the ``value`` of a ``column`` with ``new_value`` for the
+    records of an HTS code within a ``start`` to ``end`` month range, optionally
+    only for a ``country`` or for every country but ``exclude_country``. The
+    rules are expanded to one row per month so that ``corrections`` can join
+    them on the HTS code, the month, and the original value.
+
+    Args:
+        path (str | Path | None): The rule file. Defaults to the packaged rules.
+
+    Returns:
+        tuple[int, pl.DataFrame]: The version of the rule file, and a Polars
+            DataFrame with ``column``, ``hts_code``, ``year``, ``month``,
+            ``country``, ``exclude_country``, ``value``, and ``new_value``
+            columns.
+
+    Raises:
+        ValueError: If two rules match the same records of a country.
+    """
+    if path is None:
+        text = resources.files("jp_imports").joinpath("resources/corrections.json")
+        text = text.read_text()
+    else:
+        text = Path(path).read_text()
+    data = json.loads(text)
+
+    rows = []
+    for rule in data["rules"]:
+        start = dt.strptime(rule["start"], "%Y-%m")
+        end = dt.strptime(rule["end"], "%Y-%m")
+        for month in range(
+            start.year * 12 + start.month, end.year * 12 + end.month + 1
+        ):
+            rows.append(
+                {
+                    "column": rule["column"],
+                    "hts_code": rule["hts_code"],
+                    "year": (month - 1) // 12,
+                    "month": (month - 1) % 12 + 1,
+                    "country": rule.get("country"),
+                    "exclude_country": rule.get("exclude_country"),
+                    "value": str(rule["value"]),
+                    "new_value": str(rule["new_value"]),
+                }
+            )
+    rules = pl.DataFrame(
+        rows,
+        schema={
+            "column": pl.String,
+            "hts_code": pl.String,
+            "year": pl.Int32,
+            "month": pl.Int8,
+            "country": pl.String,
+            "exclude_country": pl.String,
+            "value": pl.String,
+            "new_value": pl.String,
+        },
+    )
+
+    # Two rules on the same records are only allowed when their country scopes
+    # are disjoint: two different countries, or a country and every country but
+    # that one
+    keys = ["column", "hts_code", "year", "month", "value"]
+    indexed = rules.with_row_index("rule")
+    disjoint = (
+        (pl.col("country") != pl.col("country_other"))
+        | (pl.col("country") == pl.col("exclude_country_other"))
+        | (pl.col("exclude_country") == pl.col("country_other"))
+    ).fill_null(False)
+    overlaps = (
+        indexed.join(indexed, on=keys, suffix="_other")
+        .filter(pl.col("rule") < pl.col("rule_other"))
+        .filter(~disjoint)
+    )
+    if not overlaps.is_empty():
+        raise ValueError("Correction rules overlap on the same records")
+    return data["version"], rules
+
+
+def replace_dir(staging_dir: Path, path: Path) -> None:
+    """
+    Replaces the output directory ``path`` with ``staging_dir``, a sibling of it.
+
+    ``path`` is published as a symlink to the staging directory, and every later
+    version is swapped in by renaming a new symlink over it, so ``path`` never
+    goes missing and a crash leaves either the old or the new version in place.
+    The previous version is removed once nothing points to it. A real directory
+    at ``path``, from an older release or a platform without symlinks, is
+    renamed aside before the new version takes its place.
+    """
+    link = path.parent / f".{path.name}-{uuid.uuid4().hex}.link"
+    try:
+        link.symlink_to(staging_dir.name, target_is_directory=True)
+    except OSError:
+        # Symlinks need extra privileges on Windows
+        link = None
+
+    previous = None
+    if path.is_symlink():
+        previous = path.parent / os.readlink(path)
+    elif path.exists():
+        previous = path.parent / f".{path.name}-{uuid.uuid4().hex}"
+        path.rename(previous)
+
+    if link is None:
+        staging_dir.rename(path)
+    else:
+        os.replace(link, path)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
 
 class JPTrade(TradeUtils):
     """
@@ -30,15 +231,69 @@ class JPTrade(TradeUtils):
         self,
         saving_dir: str = "data/",
         log_file: str = "data.log",
+        db_path: str = ":memory:",
+        profile: bool = False,
     ):
         """
         Initialize the DataProcess class.
+
+        ``db_path`` selects the DuckDB database used by ``self.conn``. The
+        connection comes from the shared pool in ``jp_imports.database`` instead
+        of being opened per instance.
+
+        ``profile`` turns on the instrumentation of ``jp_imports.profiling``:
+        every call records the wall time, row counts, and peak memory of its
+        stages, plus the plan and node timings of its lazy queries. The record
+        is logged as a JSON line and passed to every callback in ``hooks``.
         """
         super().__init__(saving_dir, log_file)
+        self.conn.close()
+        self.db_path = db_path
+        self.conn = connections.cursor(db_path=db_path)
         self.agr_file = str(
             resources.files("jp_imports").joinpath("resources/code_agr.json")
         )
+        self.log_file = log_file
+        self.agr_codes = load_agr_codes()
+        self.naics_labels = load_naics_labels()
+        self.unit_factors = load_unit_factors()
+        self.corrections_version, self.correction_rules = load_corrections()
+        self._prefix_indexes = {}
+        self._snapshots = {}
+        self.profile = profile
+        self.hooks: list[Callable[[dict], None]] = []
+
+    def register_unit(self, unit: str, factor: float, hts6: str | None = None) -> None:
+        """
+        Adds or updates a rule of the unit conversion table used by ``conversion``.
+
+        A rule for a unit already in the table keeps that unit's priority, a new
+        unit gets the lowest priority.
+
+        Args:
+            unit (str): The unit code, matched case-insensitively.
+            factor (float): The factor converting the unit to kilograms.
+            hts6 (str | None): If given, the rule only applies to records of this
+                HTS6 code and takes precedence over the unit's generic rule.
+                Defaults to None.
+        """
+        rule = pl.DataFrame(
+            {"unit": [unit.lower()], "hts6": [hts6], "factor": [float(factor)]},
+            schema=self.unit_factors.schema,
+        )
+        is_rule = (pl.col("unit") == unit.lower()) & (
+            pl.col("hts6").is_null() if hts6 is None else pl.col("hts6") == hts6
+        )
+        if self.unit_factors.filter(is_rule).is_empty():
+            self.unit_factors = pl.concat([self.unit_factors, rule])
+        else:
+            self.unit_factors = self.unit_factors.with_columns(
+                factor=pl.when(is_rule)
+                .then(pl.lit(float(factor)))
+                .otherwise(pl.col("factor"))
+            )
 
+    @instrumented
     def process_int_jp(
         self,
         level: Literal["hts", "naics", "country", "total"],
@@ -48,6 +303,12 @@ class JPTrade(TradeUtils):
         corrections: bool = False,
         source: Literal["jp", "org"] = "org",
         level_filter: str = "",
+        lazy: bool = False,
+        cache: bool = False,
+        cube: bool = False,
+        snapshot: bool = False,
+        engine: Literal["polars", "duckdb"] = "polars",
+        base: pl.DataFrame | pl.LazyFrame | None = None,
     ) -> pl.DataFrame:
         """
         Processes international trade data from the Puerto Rico Institute of
@@ -71,7 +332,8 @@ class JPTrade(TradeUtils):
                 ``"YYYY-MM-DD+YYYY-MM-DD"``. Defaults to an empty string, which
                 applies no date filter.
             agriculture_filter (bool): If True, limits the data to agricultural
-                products where ``agri_prod`` equals 1. Defaults to False.
+                products, whose HS4 code is listed in ``agr_codes``. Defaults to
+                False.
             source (Literal["jp", "org"]): The source of the international trade
                 data. Use ``"org"`` for the organizational source or ``"jp"`` for
                 the JP-specific source. Defaults to ``"org"``.
@@ -79,6 +341,36 @@ class JPTrade(TradeUtils):
                 taxonomy level. For example, when ``level="hts"``, this filters
                 records whose HTS code starts with the provided value. Defaults to
                 an empty string.
+            lazy (bool): If True, scans the partitioned raw parquet files and
+                builds the whole pipeline as a single ``LazyFrame`` query that is
+                only collected at the end, letting Polars push the filters and
+                column selection down into the scan. Defaults to False.
+            cache (bool): If True, reads the converted base table from the
+                on-disk parquet cache maintained by ``base_table`` instead of
+                rerunning ``corrections`` and ``conversion``. Implies a lazy
+                query. Defaults to False.
+            cube (bool): If True, answers from the rollup cube built by
+                ``build_cube``. Unfiltered requests are read directly from the
+                precomputed shape, filtered ones roll up the filtered cube, with
+                ``level_filter`` resolved through ``prefix_index``. The other
+                modes validate ``level_filter`` by scanning the data. Defaults to
+                False.
+            snapshot (bool): If True, reads the converted base table from the
+                memory-mapped snapshot published by ``publish_snapshot``, which
+                is shared with the other processes using the same
+                ``saving_dir``. Defaults to False.
+            engine (Literal["polars", "duckdb"]): The engine running the query.
+                ``"duckdb"`` runs it as a single SQL query on the ``db_path``
+                database, over the trade table of the source when the database
+                has one (e.g. loaded with the DAO's ``load_trade_data``) and over
+                the raw partitions otherwise. It cannot be combined with
+                ``cache``, ``cube``, or ``snapshot``. Defaults to ``"polars"``.
+            base (pl.DataFrame | pl.LazyFrame | None): Optional converted trade
+                data to run the query on instead of loading the source, e.g. a
+                collected ``base_table`` shared by many queries. It must already
+                be corrected when ``corrections`` is set, and cannot be combined
+                with ``lazy``, ``cache``, ``cube``, ``snapshot``, or the
+                ``"duckdb"`` engine. Defaults to None.
 
         Returns:
             pl.DataFrame: A Polars DataFrame containing the filtered, converted,
@@ -86,31 +378,463 @@ class JPTrade(TradeUtils):
 
         Raises:
             ValueError: If ``level_filter`` does not match any records for the
-                selected taxonomy level, or if ``datetime`` contains an invalid
-                number of date components.
+                selected taxonomy level, if ``datetime`` contains an invalid
+                number of date components, or if ``engine="duckdb"`` or ``base``
+                is combined with another source of data.
         """
+        df = self._query(
+            level=level,
+            time_frame=time_frame,
+            datetime=datetime,
+            agriculture_filter=agriculture_filter,
+            corrections=corrections,
+            source=source,
+            level_filter=level_filter,
+            lazy=lazy,
+            cache=cache,
+            cube=cube,
+            snapshot=snapshot,
+            engine=engine,
+            base=base,
+        )
+        if isinstance(df, pl.LazyFrame):
+            return self._collect(df)
+        return df
 
-        if source == "org":
-            df = self.pull_int_org()
+    @instrumented
+    def sink_int_jp(
+        self,
+        path: str | Path,
+        level: Literal["hts", "naics", "country", "total"],
+        time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+        datetime: str = "",
+        agriculture_filter: bool = False,
+        corrections: bool = False,
+        source: Literal["jp", "org"] = "org",
+        level_filter: str = "",
+        cache: bool = False,
+        cube: bool = False,
+        snapshot: bool = False,
+        engine: Literal["polars", "duckdb"] = "polars",
+    ) -> Path:
+        """
+        Runs a ``process_int_jp`` query on the Polars streaming engine and writes
+        the result to partitioned parquet files instead of returning it.
+
+        The query scans its input lazily and is executed in batches, so memory
+        stays bounded regardless of the number of years processed. The output is
+        partitioned by the first key of the time frame (``year`` or
+        ``fiscal_year``) in a hive layout, e.g. ``path/year=2024/``. It is
+        written to a staging directory next to ``path`` which then replaces
+        ``path`` through ``replace_dir``, so readers never see a partial or a
+        missing output.
+
+        Args:
+            path (str | Path): The output directory.
+            level (Literal["hts", "naics", "country", "total"]): The aggregation
+                level, as in ``process_int_jp``.
+            time_frame (Literal["yearly", "fiscal", "qtr", "monthly"]): The time
+                frame, as in ``process_int_jp``.
+            datetime (str): Optional date filter, as in ``process_int_jp``.
+            agriculture_filter (bool): If True, limits the data to agricultural
+                products. Defaults to False.
+            corrections (bool): If True, applies ``corrections``. Defaults to
+                False.
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            level_filter (str): Optional prefix of the selected taxonomy level,
+                as in ``process_int_jp``.
+            cache (bool): If True, streams from the cached base table. Defaults
+                to False.
+            cube (bool): If True, streams from the rollup cube. Defaults to
+                False.
+            snapshot (bool): If True, streams from the base table snapshot.
+                Defaults to False.
+            engine (Literal["polars", "duckdb"]): The engine running the query,
+                as in ``process_int_jp``. With ``"duckdb"`` the aggregation runs
+                in DuckDB and only its result is written out. Defaults to
+                ``"polars"``.
+
+        Returns:
+            Path: The output directory.
+
+        Raises:
+            ValueError: If ``level_filter`` does not match any records for the
+                selected taxonomy level, if ``datetime`` is invalid, or if the
+                ``"duckdb"`` engine is combined with ``cache``, ``cube``, or
+                ``snapshot``.
+        """
+        df = self._query(
+            level=level,
+            time_frame=time_frame,
+            datetime=datetime,
+            agriculture_filter=agriculture_filter,
+            corrections=corrections,
+            source=source,
+            level_filter=level_filter,
+            lazy=True,
+            cache=cache,
+            cube=cube,
+            snapshot=snapshot,
+            engine=engine,
+        )
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging_dir = path.parent / f".{path.name}-{uuid.uuid4().hex}"
+        df.lazy().sink_parquet(
+            pl.PartitionBy(staging_dir, key=TIME_GROUPS[time_frame][0]),
+            mkdir=True,
+            engine="streaming",
+        )
+        replace_dir(staging_dir, path)
+        logging.info(f"Streamed {time_frame}-{level} results to {path}")
+        return path
+
+    @instrumented
+    def process_many(
+        self,
+        queries: Mapping[Hashable, dict] | Iterable[dict],
+        lazy: bool = False,
+        cache: bool = False,
+        cube: bool = False,
+        snapshot: bool = False,
+    ) -> dict[Hashable, pl.DataFrame]:
+        """
+        Processes a batch of ``process_int_jp`` queries over shared base data.
+
+        Each query spec is a dict of ``process_int_jp`` arguments (``level``,
+        ``time_frame`` and optionally ``datetime``, ``agriculture_filter``,
+        ``corrections``, ``source`` and ``level_filter``). The data of every
+        ``(source, corrections)`` pair used by the batch is pulled, corrected and
+        converted once, and all the per-query aggregations are then run together
+        with ``pl.collect_all``. With ``cache``, ``cube`` or ``snapshot``, the
+        queries share the cached base table, rollup cube or snapshot instead.
+
+        Args:
+            queries (Mapping[Hashable, dict] | Iterable[dict]): The query specs,
+                either keyed by name or as a sequence.
+            lazy (bool): If True, builds the shared base data from a lazy scan of
+                the raw partitions. Defaults to False.
+            cache (bool): If True, runs the queries over the cached base table.
+                Defaults to False.
+            cube (bool): If True, runs the queries over the rollup cube.
+                Defaults to False.
+            snapshot (bool): If True, runs the queries over the base table
+                snapshot. Defaults to False.
+
+        Returns:
+            dict[Hashable, pl.DataFrame]: The result of every query, keyed by its
+                name, or by the tuple of its sorted spec items when ``queries``
+                is a sequence.
+
+        Raises:
+            ValueError: If a query spec has keys other than the query arguments
+                above, e.g. ``cache``, which is set for the whole batch, or if a
+                query fails validation in ``process_int_jp``.
+        """
+        if isinstance(queries, Mapping):
+            specs = dict(queries)
         else:
-            df = self.pull_int_jp()
+            specs = {tuple(sorted(spec.items())): spec for spec in queries}
+
+        arguments = {
+            "level", "time_frame", "datetime", "agriculture_filter", "corrections",
+            "source", "level_filter",
+        }  # fmt: skip
+        for name, spec in specs.items():
+            if unknown := sorted(set(spec) - arguments):
+                raise ValueError(
+                    f"Query {name!r} has unsupported keys {unknown}; lazy, cache, "
+                    "cube and snapshot are arguments of process_many itself"
+                )
+
+        bases = {}
+        results = {}
+        for name, spec in specs.items():
+            if not (cache or cube or snapshot):
+                source = spec.get("source", "org")
+                corrections = spec.get("corrections", False)
+                if (source, corrections) not in bases:
+                    if lazy:
+                        df = self.scan_int(source=source)
+                    else:
+                        df = self._pull(source=source)
+                    if corrections:
+                        df = self.corrections(df=df)
+                    df = self.conversion(df).lazy().collect()
+                    bases[(source, corrections)] = df
+                spec = spec | {"base": bases[(source, corrections)].lazy()}
+            results[name] = self._query(
+                **spec, cache=cache, cube=cube, snapshot=snapshot
+            )
+
+        lazy_names = [
+            name for name, df in results.items() if isinstance(df, pl.LazyFrame)
+        ]
+        collected = pl.collect_all([results[name] for name in lazy_names])
+        results.update(zip(lazy_names, collected))
+        return results
+
+    @instrumented
+    def process_parallel(
+        self,
+        level: Literal["hts", "naics", "country", "total"],
+        time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+        datetime: str = "",
+        agriculture_filter: bool = False,
+        corrections: bool = False,
+        source: Literal["jp", "org"] = "org",
+        level_filter: str = "",
+        partition: Literal["year", "fiscal"] = "year",
+        workers: int | None = None,
+        max_memory: int | None = None,
+    ) -> pl.DataFrame:
+        """
+        Processes a ``process_int_jp`` query by aggregating the raw data
+        partition by partition in a process pool.
+
+        The raw monthly partitions are grouped by calendar or fiscal year and
+        every group is corrected, converted, filtered, and summed to the keys of
+        the requested shape in its own worker process, so no process holds more
+        than one year of raw data. Groups that straddle a partition boundary
+        (e.g. fiscal years when partitioning by calendar year) get one partial
+        sum per partition, and the partial sums are added up by
+        ``process_data``, so the result is exactly that of ``process_int_jp``.
+
+        Args:
+            level (Literal["hts", "naics", "country", "total"]): The aggregation
+                level, as in ``process_int_jp``.
+            time_frame (Literal["yearly", "fiscal", "qtr", "monthly"]): The time
+                frame, as in ``process_int_jp``.
+            datetime (str): Optional date filter, as in ``process_int_jp``.
+            agriculture_filter (bool): If True, limits the data to agricultural
+                products. Defaults to False.
+            corrections (bool): If True, applies ``corrections``. Defaults to
+                False.
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            level_filter (str): Optional prefix of the selected taxonomy level,
+                as in ``process_int_jp``.
+            partition (Literal["year", "fiscal"]): Whether to split the raw data
+                by calendar or fiscal year. Defaults to ``"year"``.
+            workers (int | None): The number of worker processes. Defaults to
+                the number of CPUs.
+            max_memory (int | None): Optional cap, in bytes, on the address
+                space of every worker process. Only enforced on platforms with
+                the ``resource`` module. Defaults to no cap.
+
+        Returns:
+            pl.DataFrame: The same DataFrame ``process_int_jp`` returns.
+
+        Raises:
+            ValueError: If ``level_filter`` does not match any records for the
+                selected taxonomy level, or if ``datetime`` is invalid.
+        """
+        raw_dir = self.raw_dir(source=source)
+        partitions = {}
+        for file in sorted(raw_dir.glob("*/*/*.parquet")):
+            year, month = int(file.parent.parent.name), int(file.parent.name)
+            if partition == "fiscal" and month > 6:
+                year += 1
+            partitions.setdefault(year, []).append(str(file))
+
+        spec = {
+            "keys": TIME_GROUPS[time_frame] + LEVEL_GROUPS[level],
+            "datetime": datetime,
+            "agriculture_filter": agriculture_filter,
+            "corrections": corrections,
+            "level_filter": level_filter if LEVEL_GROUPS[level] else None,
+            "filter_col": (LEVEL_GROUPS[level] or [None])[0],
+        }
+        # Imported here since only this path needs the process pool machinery
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Spawned workers do not inherit the thread pools of the parent Polars
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(
+                self.saving_dir,
+                self.log_file,
+                self.unit_factors,
+                self.correction_rules,
+                max_memory,
+            ),
+        ) as pool:
+            results = list(
+                pool.map(
+                    _aggregate_partition,
+                    partitions.values(),
+                    [spec] * len(partitions),
+                )
+            )
+
+        if spec["level_filter"] is not None and not any(
+            matched for _, matched in results
+        ):
+            raise ValueError(f"Invalid {level.upper()} code: {level_filter}")
+        partials = pl.concat([df for df, _ in results], how="vertical_relaxed")
+        return self.process_data(time_frame=time_frame, level=level, base=partials)
+
+    def _query(
+        self,
+        level: Literal["hts", "naics", "country", "total"],
+        time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+        datetime: str = "",
+        agriculture_filter: bool = False,
+        corrections: bool = False,
+        source: Literal["jp", "org"] = "org",
+        level_filter: str = "",
+        lazy: bool = False,
+        cache: bool = False,
+        cube: bool = False,
+        snapshot: bool = False,
+        engine: Literal["polars", "duckdb"] = "polars",
+        base: pl.DataFrame | pl.LazyFrame | None = None,
+    ) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Builds the query of ``process_int_jp`` without collecting it. ``base``
+        optionally gives data that was already corrected and converted.
+        """
+        if base is not None and (lazy or cache or cube or snapshot):
+            raise ValueError(
+                "base cannot be combined with lazy, cache, cube or snapshot"
+            )
+        precomputed = cache or cube or snapshot or base is not None
+        if engine == "duckdb":
+            if precomputed:
+                raise ValueError("The duckdb engine only queries the raw trade data")
+            return self._query_duckdb(
+                level=level,
+                time_frame=time_frame,
+                datetime=datetime,
+                agriculture_filter=agriculture_filter,
+                corrections=corrections,
+                source=source,
+                level_filter=level_filter,
+            )
+
+        indexed = False
+        if base is not None:
+            df = base
+        elif cube:
+            cube_dir = self.build_cube(source=source, corrections=corrections)
+            shape_path = cube_dir / f"{time_frame}-{level}.parquet"
+            filtered = agriculture_filter or datetime or level_filter
+            if not filtered and shape_path.exists():
+                return pl.read_parquet(shape_path)
+            df = pl.scan_parquet(cube_dir / "cube.parquet")
+            if level_filter and level in ["hts", "naics", "country"]:
+                # Resolve the prefix against the index before touching the cube
+                index = self.prefix_index(
+                    level=level,
+                    source=source,
+                    corrections=corrections,
+                    agriculture_filter=agriculture_filter,
+                )
+                codes = index.match(level_filter)
+                if not codes:
+                    raise ValueError(f"Invalid {level.upper()} code: {level_filter}")
+                rows = index.rows(level_filter)
+                if rows is not None:
+                    df = df.slice(*rows)
+                else:
+                    col = LEVEL_GROUPS[level][0]
+                    df = df.filter(pl.col(col).cast(pl.String).is_in(codes))
+                indexed = True
+        elif snapshot:
+            df = self.snapshot(source=source, corrections=corrections)
+        elif cache:
+            df = self.base_table(source=source, corrections=corrections)
+        elif lazy:
+            df = self.scan_int(source=source)
+        else:
+            df = self._pull(source=source)
 
         if agriculture_filter:
-            df = df.filter(pl.col("agri_prod") == 1)
+            df = self.filter_agriculture(df)
 
-        if corrections:
+        if corrections and not precomputed:
             df = self.corrections(df=df)
 
         # Unified taxonomy filtering
-        if level in ["hts", "naics", "country"]:
+        if level in ["hts", "naics", "country"] and not indexed:
             level_map = {"hts": "hts_code", "naics": "naics", "country": "country"}
             filter_col = level_map[level]
 
-            df = df.filter(pl.col(filter_col).str.starts_with(level_filter))
-            if df.is_empty():
+            if df.collect_schema()[filter_col] == pl.Categorical:
+                matches = pl.col(filter_col).cat.starts_with(level_filter)
+            else:
+                matches = pl.col(filter_col).str.starts_with(level_filter)
+            df = df.filter(matches)
+            if isinstance(df, pl.LazyFrame):
+                # Only a single matching row is needed to validate the code
+                is_empty = df.select(filter_col).head(1).collect().is_empty()
+            else:
+                is_empty = df.is_empty()
+            if is_empty:
                 raise ValueError(f"Invalid {level.upper()} code: {level_filter}")
 
-        # Streamlined date routing
+        df = self._date_filter(df, datetime)
+
+        if not precomputed:
+            df = self.conversion(df)
+        return self.process_data(time_frame=time_frame, level=level, base=df)
+
+    @instrumented
+    def _query_duckdb(
+        self,
+        level: Literal["hts", "naics", "country", "total"],
+        time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+        datetime: str = "",
+        agriculture_filter: bool = False,
+        corrections: bool = False,
+        source: Literal["jp", "org"] = "org",
+        level_filter: str = "",
+    ) -> pl.DataFrame:
+        """
+        Runs a ``process_int_jp`` query in DuckDB on the calling thread's
+        read-only cursor of ``db_path``, with the same unit factors, agricultural
+        codes, and correction rules as the Polars engine.
+        """
+        # Imported here since the SQL builders import this module
+        from .sql import SOURCE_TABLES, process_int_sql, sql_literal
+
+        conn = connections.cursor(db_path=self.db_path, read_only=True)
+        relation = SOURCE_TABLES[source]
+        exists = conn.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?;",
+            [relation],
+        ).fetchone()
+        if exists is None:
+            files = self.raw_dir(source=source) / "**" / "*.parquet"
+            relation = f"read_parquet({sql_literal(str(files))})"
+
+        return process_int_sql(
+            conn=conn,
+            relation=relation,
+            level=level,
+            time_frame=time_frame,
+            datetime=datetime,
+            agriculture_filter=agriculture_filter,
+            level_filter=level_filter,
+            unit_factors=self.unit_factors,
+            agr_codes=self.agr_codes,
+            correction_rules=self.correction_rules if corrections else None,
+        )
+
+    @staticmethod
+    def _date_filter(
+        df: pl.DataFrame | pl.LazyFrame, datetime: str
+    ) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Filters ``df`` by a ``process_int_jp`` ``datetime`` argument, a single
+        year or a ``"start_date+end_date"`` range.
+        """
         if datetime:
             times = datetime.split("+")
             if len(times) == 2:
@@ -123,37 +847,827 @@ class JPTrade(TradeUtils):
                 raise ValueError(
                     'Invalid time format. Use "date" or "start_date+end_date"'
                 )
+        return df
 
-        df = self.conversion(df)
+    @instrumented
+    def _pull(self, source: Literal["jp", "org"] = "org") -> pl.DataFrame:
+        """Pulls the raw international trade data of a source with ``TradeUtils``."""
+        if source == "org":
+            return self.pull_int_org()
+        return self.pull_int_jp()
 
-        return self.process_data(time_frame=time_frame, level=level, base=df)
+    def _collect(self, df: pl.LazyFrame) -> pl.DataFrame:
+        """Collects a lazy query, profiling it when the call is profiled."""
+        return collect(df)
 
-    def process_data(
-        self, time_frame: str, level: str, base: pl.DataFrame
+    @instrumented
+    def scan_int(self, source: Literal["jp", "org"] = "org") -> pl.LazyFrame:
+        """
+        Lazily scans the partitioned raw international trade data.
+
+        The raw data is stored by ``TradeUtils`` as monthly parquet partitions under
+        ``saving_dir/raw/<source>/``. If the partitions do not exist yet, the
+        corresponding pull is run once to create them.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+
+        Returns:
+            pl.LazyFrame: A Polars LazyFrame over all the raw monthly partitions.
+        """
+        return pl.scan_parquet(self.raw_dir(source=source) / "**" / "*.parquet")
+
+    def raw_dir(self, source: Literal["jp", "org"] = "org") -> Path:
+        """
+        Returns the directory holding the raw monthly partitions of a source,
+        running the corresponding pull first if no partition exists yet.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+
+        Returns:
+            Path: The ``saving_dir/raw/<source>/`` directory.
+
+        Raises:
+            FileNotFoundError: If the pull does not write any
+                ``<year>/<MM>/*.parquet`` partition, as with pr-imports releases
+                before 0.4.2.
+        """
+        raw_dir = self.saving_dir / "raw" / source
+        if not any(raw_dir.glob("*/*/*.parquet")):
+            self._pull(source=source)
+        if not any(raw_dir.glob("*/*/*.parquet")):
+            raise FileNotFoundError(
+                f"No <year>/<MM> partitions in {raw_dir}, the partitioned raw "
+                "layout needs pr-imports>=0.4.2"
+            )
+
+        return raw_dir
+
+    def partition_stats(
+        self, source: Literal["jp", "org"] = "org"
+    ) -> dict[str, list[int]]:
+        """
+        Lists the raw partitions of a source with their size and modification time.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+
+        Returns:
+            dict[str, list[int]]: The ``[size, mtime_ns]`` of every raw parquet
+                partition, keyed by its path relative to the source directory
+                (e.g. ``"2024/01/data.parquet"``).
+        """
+        raw_dir = self.raw_dir(source=source)
+        stats = {}
+        for file in sorted(raw_dir.glob("**/*.parquet")):
+            stat = file.stat()
+            stats[file.relative_to(raw_dir).as_posix()] = [
+                stat.st_size,
+                stat.st_mtime_ns,
+            ]
+        return stats
+
+    def fingerprint(self, source: Literal["jp", "org"] = "org") -> str:
+        """
+        Computes a fingerprint of the raw partitions of a source.
+
+        The fingerprint is derived from the relative path, size, and modification
+        time of every raw parquet partition, so it changes whenever the upstream
+        pull adds, rewrites, or removes a partition without reading any data.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+
+        Returns:
+            str: A hexadecimal digest identifying the current raw data.
+        """
+        return self._fingerprint(self.partition_stats(source=source))
+
+    def refresh(
+        self,
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+    ) -> list[tuple[int, int]]:
+        """
+        Incrementally brings the cached base table and rollup cube up to date with
+        the raw partitions.
+
+        The raw partitions are compared against the manifest of the latest cube
+        entry to detect the ``(year, month)`` partitions that were added, rewritten,
+        or removed upstream. Only the base table years, cube months, and shape
+        groups (months, quarters, years, and fiscal years) touched by those
+        partitions are recomputed and merged with the stored results. Price
+        statistics derived from the cube, such as the four-quarter YoY window of
+        ``process_price``, pick up the refreshed quarters on their next call.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            corrections (bool): If True, refreshes the corrected cache entries.
+                Defaults to False.
+
+        Returns:
+            list[tuple[int, int]]: The sorted ``(year, month)`` partitions that
+                were recomputed. Empty if the cache was already up to date.
+        """
+        _, cache_dir, stats, _, changed = self._cache_entry(
+            kind="cube", source=source, corrections=corrections
+        )
+        if cache_dir.exists():
+            return []
+
+        self.build_cube(source=source, corrections=corrections)
+        if changed is None:
+            changed = self._changed_partitions({}, stats) or set()
+        logging.info(f"Refreshed {len(changed)} {source} partitions")
+
+        return sorted(changed)
+
+    @instrumented
+    def base_table(
+        self,
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+    ) -> pl.LazyFrame:
+        """
+        Returns the converted and date-enriched base table from the on-disk cache,
+        building it first if needed.
+
+        The cache lives under ``saving_dir/cache/base/`` and is keyed by source,
+        corrections flag, and the ``fingerprint`` of the raw partitions. Each entry
+        is stored as parquet files partitioned by year and is shared by every
+        process using the same ``saving_dir``. When the upstream data changes, only
+        the years with changed raw partitions are rebuilt, the other years are
+        carried over from the previous entry, and the stale entries for the same
+        source and corrections flag are evicted.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            corrections (bool): If True, applies ``corrections`` before the
+                conversion. Defaults to False.
+
+        Returns:
+            pl.LazyFrame: A Polars LazyFrame over the cached base table.
+        """
+        key, cache_dir, stats, previous, changed = self._cache_entry(
+            kind="base", source=source, corrections=corrections
+        )
+
+        if not cache_dir.exists():
+            links = {}
+            if changed is None:
+                df = self.scan_int(source=source)
+            else:
+                raw_dir = self.raw_dir(source=source)
+                changed_years = {year for year, _ in changed}
+                for file in previous.glob("*/data.parquet"):
+                    if int(file.parent.name) not in changed_years:
+                        links[f"{file.parent.name}/data.parquet"] = file
+                paths = [
+                    file
+                    for year in sorted(changed_years)
+                    for file in sorted((raw_dir / str(year)).glob("**/*.parquet"))
+                ]
+                df = pl.scan_parquet(paths) if paths else None
+
+            files = {}
+            if df is not None:
+                if corrections:
+                    df = self.corrections(df=df)
+                df = self.conversion(df).collect()
+
+                # Descriptions are only needed at output time, so they are kept
+                # in a dimension table instead of being repeated on every row
+                if "hts_desc" in df.columns:
+                    descriptions = [df.select("hts_code", "hts_desc")]
+                    if (
+                        previous is not None
+                        and (previous / "hts_desc.parquet").exists()
+                    ):
+                        descriptions.insert(
+                            0, pl.read_parquet(previous / "hts_desc.parquet")
+                        )
+                    files["hts_desc.parquet"] = (
+                        pl.concat(descriptions)
+                        .drop_nulls("hts_code")
+                        .unique("hts_code", keep="last", maintain_order=True)
+                        .sort("hts_code")
+                    )
+
+                df = self.compact(df)
+                for (year,), year_df in df.partition_by(["year"], as_dict=True).items():
+                    files[f"{year}/data.parquet"] = year_df
+
+            self._publish_cache(
+                files=files, cache_dir=cache_dir, key=key, stats=stats, links=links
+            )
+
+        return pl.scan_parquet(cache_dir / "*" / "data.parquet")
+
+    def compact(self, df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Casts converted trade data to the compact schema used for cached tables.
+
+        The taxonomy and unit columns are stored as categoricals and the trade
+        flag as an 8-bit integer following ``COMPACT_SCHEMA``. The
+        ``DERIVED_COLUMNS`` are dropped, since ``hts_desc`` is available from
+        ``descriptions`` and ``agri_prod`` from ``agr_codes``. Group-by keys are
+        cast back to strings by ``process_data``, so aggregated outputs keep
+        their schema.
+
+        Args:
+            df (pl.DataFrame | pl.LazyFrame): A Polars frame with converted trade
+                data, as returned by ``conversion``.
+
+        Returns:
+            pl.DataFrame | pl.LazyFrame: The same frame in the compact schema.
+        """
+        names = df.collect_schema().names()
+        return df.with_columns(
+            pl.col(col).cast(dtype)
+            for col, dtype in COMPACT_SCHEMA.items()
+            if col in names
+        ).drop(DERIVED_COLUMNS, strict=False)
+
+    def publish_snapshot(
+        self,
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+    ) -> Path:
+        """
+        Publishes the cached base table as an uncompressed Arrow IPC (Feather v2)
+        snapshot that other processes open memory-mapped with ``snapshot``.
+
+        Polars re-encodes categorical columns into its own categories when they
+        are imported, which would copy them into every reader. The categorical
+        columns are therefore stored as the integer codes of their sorted
+        categories, and the categories in the ``SNAPSHOT_CATEGORIES`` schema
+        metadata, so that every column is a plain array read without a copy.
+
+        Snapshots live under ``saving_dir/snapshot/`` as one file per version,
+        named after the ``fingerprint`` of the raw partitions. The file is
+        written under a private name and renamed into place, then the
+        ``<key>.json`` pointer to the current version is replaced atomically.
+        Readers holding an older version keep their mapping, only the versions
+        before the previous one are removed.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            corrections (bool): If True, publishes the corrected base table.
+                Defaults to False.
+
+        Returns:
+            Path: The snapshot file of the published version.
+        """
+        df = self.base_table(source=source, corrections=corrections).collect()
+        key = f"{source}-{'corrected' if corrections else 'uncorrected'}"
+        snapshot_dir = self.saving_dir / "snapshot"
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        path = snapshot_dir / f"{key}-{self.fingerprint(source=source)}.arrow"
+
+        if not path.exists():
+            # Imported here since pyarrow is only needed for snapshots
+            import pyarrow as pa
+
+            categories = {
+                col: df[col].drop_nulls().unique().cast(pl.String).sort().to_list()
+                for col, dtype in df.schema.items()
+                if dtype == pl.Categorical
+            }
+            table = df.with_columns(
+                pl.col(col).cast(pl.String).cast(pl.Enum(values)).to_physical()
+                for col, values in categories.items()
+            ).to_arrow()
+            table = table.replace_schema_metadata(
+                {SNAPSHOT_CATEGORIES: json.dumps(categories)}
+            )
+            tmp_path = snapshot_dir / f".{key}-{uuid.uuid4().hex}.arrow"
+            with (
+                pa.OSFile(str(tmp_path), "wb") as sink,
+                pa.ipc.new_file(sink, table.schema) as writer,
+            ):
+                writer.write_table(table)
+            os.replace(tmp_path, path)
+
+        pointer = snapshot_dir / f"{key}.json"
+        previous = json.loads(pointer.read_text())["file"] if pointer.exists() else None
+        tmp_pointer = snapshot_dir / f".{key}-{uuid.uuid4().hex}.json"
+        tmp_pointer.write_text(json.dumps({"file": path.name, "rows": df.height}))
+        os.replace(tmp_pointer, pointer)
+
+        for stale_path in snapshot_dir.glob(f"{key}-*.arrow"):
+            if stale_path.name not in (path.name, previous):
+                try:
+                    stale_path.unlink()
+                except OSError:
+                    # Still mapped by a reader on a platform that forbids it
+                    pass
+        logging.info(f"Published snapshot {path}")
+        return path
+
+    def snapshot(
+        self,
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+    ) -> pl.LazyFrame:
+        """
+        Returns the current base table snapshot, memory-mapped with zero copy.
+
+        The pages of the mapping belong to the OS page cache, so every process
+        reading the same version shares a single copy of the data. Categorical
+        columns are mapped as their integer codes and only decoded by the
+        queries collecting them, so a decoded column lives as long as the query.
+        The pointer is checked on every call and a newer version is mapped once
+        it is published, the first call publishes a snapshot if none exists yet.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            corrections (bool): If True, returns the corrected base table.
+                Defaults to False.
+
+        Returns:
+            pl.LazyFrame: The converted base table in the compact schema, as
+                returned by ``base_table``.
+        """
+        import pyarrow as pa
+
+        key = f"{source}-{'corrected' if corrections else 'uncorrected'}"
+        snapshot_dir = self.saving_dir / "snapshot"
+        pointer = snapshot_dir / f"{key}.json"
+        if not pointer.exists():
+            self.publish_snapshot(source=source, corrections=corrections)
+
+        for _ in range(3):
+            name = json.loads(pointer.read_text())["file"]
+            cached = self._snapshots.get(key)
+            if cached is None or cached[0] != name:
+                try:
+                    reader = pa.ipc.open_file(pa.memory_map(str(snapshot_dir / name)))
+                except FileNotFoundError:
+                    # Evicted between reading the pointer and opening it
+                    continue
+                categories = json.loads(reader.schema.metadata[SNAPSHOT_CATEGORIES])
+                df = pl.from_arrow(reader.read_all(), rechunk=False)
+                cached = self._snapshots[key] = (name, df, categories)
+
+            _, df, categories = cached
+            return df.lazy().with_columns(
+                pl.lit(pl.Series(values, dtype=pl.Categorical))
+                .gather(pl.col(col))
+                .alias(col)
+                for col, values in categories.items()
+            )
+        raise RuntimeError(f"Snapshot {key} is republished too fast to be opened")
+
+    def descriptions(
+        self,
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+    ) -> pl.DataFrame:
+        """
+        Returns the HTS description dimension split out of the cached base table.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data, as in ``process_int_jp``. A source without an ``hts_desc``
+                column has no descriptions. Defaults to ``"org"``.
+            corrections (bool): Whether to use the corrected cache entry.
+                Defaults to False.
+
+        Returns:
+            pl.DataFrame: A Polars DataFrame with ``hts_code`` and ``hts_desc``
+                columns, empty if the source has no descriptions.
+        """
+        self.base_table(source=source, corrections=corrections)
+        _, cache_dir, *_ = self._cache_entry(
+            kind="base", source=source, corrections=corrections
+        )
+        path = cache_dir / "hts_desc.parquet"
+        if not path.exists():
+            return pl.DataFrame(schema={"hts_code": pl.String, "hts_desc": pl.String})
+        return pl.read_parquet(path)
+
+    def describe(
+        self,
+        df: pl.DataFrame,
+        source: Literal["jp", "org"] = "org",
     ) -> pl.DataFrame:
+        """
+        Joins the descriptions back onto an aggregated output at output time.
+
+        Args:
+            df (pl.DataFrame): An output of ``process_int_jp`` or ``process_data``.
+            source (Literal["jp", "org"]): The source to take the descriptions
+                from, which should be the one ``df`` was built from. Defaults to
+                ``"org"``.
+
+        Returns:
+            pl.DataFrame: The same DataFrame with an ``hts_desc`` column when it
+                has an ``hts_code`` column, and a ``naics_desc`` column with the
+                label of the longest labeled prefix of the NAICS code when it has
+                a ``naics`` column.
+        """
+        if "hts_code" in df.columns:
+            df = df.join(self.descriptions(source=source), on="hts_code", how="left")
+        if "naics" in df.columns:
+            df = df.with_columns(
+                naics_desc=pl.coalesce(
+                    pl.col("naics")
+                    .cast(pl.String)
+                    .str.slice(0, length)
+                    .replace_strict(self.naics_labels, default=None)
+                    for length in sorted(map(len, self.naics_labels), reverse=True)
+                )
+            )
+        return df
+
+    @instrumented
+    def filter_agriculture(
+        self, df: pl.DataFrame | pl.LazyFrame
+    ) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Keeps the records of agricultural products, with a semi-join of their
+        HS4 code on ``agr_codes``.
+
+        Args:
+            df (pl.DataFrame | pl.LazyFrame): A Polars frame with an ``hts_code``
+                column.
+
+        Returns:
+            pl.DataFrame | pl.LazyFrame: The agricultural records of ``df``.
+        """
+        agr_codes = self.agr_codes
+        if isinstance(df, pl.LazyFrame):
+            agr_codes = agr_codes.lazy()
+        return df.join(
+            agr_codes,
+            left_on=pl.col("hts_code").cast(pl.String).str.slice(0, 4),
+            right_on="hs4",
+            how="semi",
+        )
+
+    @instrumented
+    def build_cube(
+        self,
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+    ) -> Path:
+        """
+        Builds the persisted rollup cube of the trade data, reusing it when the
+        upstream data has not changed.
+
+        The cube is the aggregation of the cached ``base_table`` at its finest
+        grain: month by HTS code, NAICS code (when the source has it), and
+        country. Every ``TIME_GROUPS`` by ``LEVEL_GROUPS`` shape is
+        then derived by rolling up the cube rather than rescanning the base
+        table. Everything is stored under ``saving_dir/cache/cube/`` keyed like
+        ``base_table``, as ``cube.parquet`` plus one ``<time_frame>-<level>``
+        parquet file per shape. When the upstream data changes, only the changed
+        months of the cube and the shape groups containing them are recomputed.
+
+        Args:
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            corrections (bool): If True, applies ``corrections`` before the
+                aggregation. Defaults to False.
+
+        Returns:
+            Path: The directory of the cube entry.
+        """
+        key, cache_dir, stats, previous, changed = self._cache_entry(
+            kind="cube", source=source, corrections=corrections
+        )
+
+        if not cache_dir.exists():
+            base = self.base_table(source=source, corrections=corrections)
+            names = base.collect_schema().names()
+            levels = [
+                level
+                for level, cols in LEVEL_GROUPS.items()
+                if all(col in names for col in cols)
+            ]
+            shapes = [
+                (time_frame, level) for time_frame in TIME_GROUPS for level in levels
+            ]
+
+            # Every time dimension is derived from the monthly date, so keeping
+            # them all as keys does not add groups but lets the cube answer the
+            # same filters and groupings as the base table
+            time_keys = ["date"] + list(dict.fromkeys(sum(TIME_GROUPS.values(), [])))
+            level_keys = sum((LEVEL_GROUPS[level] for level in levels), [])
+            cube_keys = time_keys + level_keys
+
+            if changed is None:
+                cube = self.filter_data(base, cube_keys).collect()
+                rollups = pl.collect_all(
+                    [
+                        self.process_data(
+                            time_frame=time_frame, level=level, base=cube.lazy()
+                        )
+                        for time_frame, level in shapes
+                    ]
+                )
+            else:
+                schema = base.collect_schema()
+                months = pl.DataFrame(
+                    sorted(changed),
+                    schema={"year": schema["year"], "month": schema["month"]},
+                    orient="row",
+                )
+                old_cube = pl.read_parquet(previous / "cube.parquet")
+                old_rows = old_cube.join(months, on=["year", "month"], how="semi")
+                new_rows = self.filter_data(
+                    base.join(months.lazy(), on=["year", "month"], how="semi"),
+                    cube_keys,
+                ).collect()
+                cube = pl.concat(
+                    [old_cube.join(months, on=["year", "month"], how="anti"), new_rows]
+                )
+
+                # A shape group is stale if any of its months changed, so only
+                # those groups are rolled up again from the refreshed cube
+                touched = pl.concat([old_rows, new_rows])
+                rollups = []
+                for time_frame, level in shapes:
+                    affected = touched.select(TIME_GROUPS[time_frame]).unique()
+                    old_shape = pl.read_parquet(
+                        previous / f"{time_frame}-{level}.parquet"
+                    )
+                    new_shape = self.process_data(
+                        time_frame=time_frame,
+                        level=level,
+                        base=cube.join(
+                            affected, on=TIME_GROUPS[time_frame], how="semi"
+                        ),
+                    )
+                    rollups.append(
+                        pl.concat(
+                            [
+                                old_shape.join(
+                                    affected, on=TIME_GROUPS[time_frame], how="anti"
+                                ),
+                                new_shape,
+                            ]
+                        ).sort(TIME_GROUPS[time_frame] + LEVEL_GROUPS[level])
+                    )
+
+            # Sorting by HTS code lays every HTS prefix out as a contiguous range
+            # of rows, which the prefix indexes record as row offsets
+            cube = cube.sort(pl.col(CUBE_SORT_KEY).cast(pl.String), "date")
+            files = {"cube.parquet": cube}
+            for (time_frame, level), rollup in zip(shapes, rollups):
+                # Unfiltered queries drop the groups without a level code in
+                # their prefix filter, the shapes are served without one
+                files[f"{time_frame}-{level}.parquet"] = rollup.drop_nulls(
+                    LEVEL_GROUPS[level]
+                )
+            for level in levels:
+                if LEVEL_GROUPS[level]:
+                    files[f"index-{level}.parquet"] = self._prefix_frame(
+                        cube, LEVEL_GROUPS[level][0]
+                    )
+            self._publish_cache(files=files, cache_dir=cache_dir, key=key, stats=stats)
+
+        return cache_dir
+
+    def prefix_index(
+        self,
+        level: Literal["hts", "naics", "country"],
+        source: Literal["jp", "org"] = "org",
+        corrections: bool = False,
+        agriculture_filter: bool = False,
+    ) -> PrefixIndex:
+        """
+        Loads the prefix index of a level column of the rollup cube.
+
+        The index holds the sorted distinct codes of the column, so a
+        ``level_filter`` is validated and resolved with a binary search instead
+        of a scan. For ``hts`` it also holds the row offsets of every code in
+        the cube, which is sorted by HTS code. Indexes are kept in memory per
+        cube entry. Only ``cube=True`` queries use it: building the cube to
+        validate a prefix would cost the other modes more than their scan.
+
+        Args:
+            level (Literal["hts", "naics", "country"]): The level to index.
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            corrections (bool): If True, indexes the corrected cube. Defaults to
+                False.
+            agriculture_filter (bool): If True, only indexes the codes of
+                agricultural products. Defaults to False.
+
+        Returns:
+            PrefixIndex: The index of the level column.
+        """
+        path = self.build_cube(source=source, corrections=corrections)
+        path = path / f"index-{level}.parquet"
+        key = (path, agriculture_filter)
+        if key not in self._prefix_indexes:
+            df = pl.read_parquet(path)
+            if agriculture_filter:
+                df = df.filter(pl.col("agriculture"))
+            self._prefix_indexes[key] = PrefixIndex.from_frame(df)
+        return self._prefix_indexes[key]
+
+    def _prefix_frame(self, cube: pl.DataFrame, col: str) -> pl.DataFrame:
+        """
+        Builds the sorted distinct codes of ``col`` for ``PrefixIndex``, flagging
+        the codes with agricultural records, with the rows of each code when
+        ``col`` is the sort key of the cube.
+        """
+        hs4 = pl.col("hts_code").cast(pl.String).str.slice(0, 4)
+        aggs = [hs4.is_in(self.agr_codes["hs4"].implode()).any().alias("agriculture")]
+        if col == CUBE_SORT_KEY:
+            aggs += [pl.col("index").min().alias("start"), pl.len().alias("length")]
+        return (
+            cube.with_row_index()
+            .filter(pl.col(col).is_not_null())
+            .group_by(pl.col(col).cast(pl.String).alias("code"))
+            .agg(aggs)
+            .sort("code")
+        )
+
+    def _cache_entry(
+        self,
+        kind: str,
+        source: Literal["jp", "org"],
+        corrections: bool,
+    ) -> tuple[str, Path, dict[str, list[int]], Path | None, set | None]:
+        """
+        Resolves the cache entry matching the current raw partitions and, when it
+        does not exist yet, what changed since the latest published entry.
+
+        Args:
+            kind (str): The cache kind, used as the directory under
+                ``saving_dir/cache/``.
+            source (Literal["jp", "org"]): The source of the international trade
+                data.
+            corrections (bool): Whether the entry holds corrected data.
+
+        Returns:
+            tuple[str, Path, dict[str, list[int]], Path | None, set | None]: The
+                cache key, the directory of the current entry, the raw partition
+                stats, the directory of the previous entry, and the set of changed
+                ``(year, month)`` partitions. The last two are None when the entry
+                must be built from scratch.
+        """
+        key = f"{source}-{'corrected' if corrections else 'uncorrected'}"
+        stats = self.partition_stats(source=source)
+        cache_root = self.saving_dir / "cache" / kind
+        cache_dir = cache_root / f"{key}-{self._fingerprint(stats)}"
+
+        if not cache_dir.exists():
+            for previous in cache_root.glob(f"{key}-*"):
+                manifest_path = previous / "manifest.json"
+                if not manifest_path.exists():
+                    continue
+                manifest = json.loads(manifest_path.read_text())
+                if manifest.get("signature") != self._cache_signature():
+                    continue
+                changed = self._changed_partitions(manifest["partitions"], stats)
+                if changed is not None:
+                    return key, cache_dir, stats, previous, changed
+
+        return key, cache_dir, stats, None, None
+
+    def _cache_signature(self) -> str:
+        """
+        Identifies the logic the cached tables are derived with: the cache
+        version, the unit conversion table, the correction rules, and the
+        agricultural codes.
+        """
+        rules = (
+            self.unit_factors.write_csv()
+            + self.correction_rules.write_csv()
+            + self.agr_codes.write_csv()
+        )
+        digest = hashlib.md5(rules.encode()).hexdigest()
+        return f"v{BASE_CACHE_VERSION}-c{self.corrections_version}-{digest}"
+
+    def _fingerprint(self, stats: dict[str, list[int]]) -> str:
+        digest = hashlib.md5(self._cache_signature().encode())
+        for name, (size, mtime_ns) in stats.items():
+            digest.update(f"{name}:{size}:{mtime_ns};".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _changed_partitions(
+        old: dict[str, list[int]], new: dict[str, list[int]]
+    ) -> set[tuple[int, int]] | None:
+        """
+        Returns the ``(year, month)`` partitions that differ between two sets of
+        partition stats, or None if a changed partition is not laid out as
+        ``<year>/<month>/<file>``.
+        """
+        changed = set()
+        for name in old.keys() | new.keys():
+            if old.get(name) == new.get(name):
+                continue
+            parts = name.split("/")
+            if len(parts) != 3 or not (parts[0].isdigit() and parts[1].isdigit()):
+                return None
+            changed.add((int(parts[0]), int(parts[1])))
+        return changed
+
+    def _publish_cache(
+        self,
+        files: dict[str, pl.DataFrame],
+        cache_dir: Path,
+        key: str,
+        stats: dict[str, list[int]] | None = None,
+        links: dict[str, Path] | None = None,
+    ) -> None:
+        """
+        Writes a cache entry and publishes it atomically, evicting stale entries.
+
+        The files are written to a private staging directory next to
+        ``cache_dir`` and swapped in with a directory rename, so concurrent readers
+        never see a partially written entry. Once published, every other entry
+        under the same cache root whose name starts with ``key`` is removed.
+
+        Args:
+            files (dict[str, pl.DataFrame]): The frames to write, keyed by their
+                path relative to ``cache_dir``.
+            cache_dir (Path): The directory of the cache entry.
+            key (str): The cache key shared by all versions of the entry.
+            stats (dict[str, list[int]] | None): The raw partition stats the entry
+                was built from, stored in its ``manifest.json`` for incremental
+                refreshes. Defaults to None.
+            links (dict[str, Path] | None): Unchanged files carried over from a
+                previous entry, keyed by their path relative to ``cache_dir``.
+                They are hard-linked when possible. Defaults to None.
+        """
+        cache_root = cache_dir.parent
+        tmp_dir = cache_root / f".{key}-{uuid.uuid4().hex}"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name, df in files.items():
+            file_path = tmp_dir / name
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            df.write_parquet(file_path)
+
+        for name, source_path in (links or {}).items():
+            file_path = tmp_dir / name
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(source_path, file_path)
+            except OSError:
+                shutil.copy2(source_path, file_path)
+
+        if stats is not None:
+            manifest = {"signature": self._cache_signature(), "partitions": stats}
+            (tmp_dir / "manifest.json").write_text(json.dumps(manifest))
+
+        try:
+            tmp_dir.rename(cache_dir)
+        except OSError:
+            # Another process published the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        for stale_dir in cache_root.glob(f"{key}-*"):
+            if stale_dir != cache_dir:
+                shutil.rmtree(stale_dir, ignore_errors=True)
+        logging.info(f"Published cache entry {cache_dir}")
+
+    @instrumented
+    def process_data(
+        self,
+        time_frame: str,
+        level: str,
+        base: pl.DataFrame | pl.LazyFrame,
+    ) -> pl.DataFrame | pl.LazyFrame:
         """
         Processes and aggregates trade data according to the requested time frame
         and classification level.
 
         The method validates the requested grouping configuration, dynamically
         determines the required time and classification columns, and delegates
-        filtering and aggregation to ``filter_data``. It then resolves duplicate
-        columns created during joins by coalescing null values, removes temporary
-        ``_right`` columns, fills missing trade metrics with zeros, and calculates
-        net import and export values for both monetary and quantity measures.
+        filtering and aggregation to ``filter_data``. A ``base`` that is already
+        aggregated, such as the rollup cube built by ``build_cube``, is rolled up
+        by summing its trade metrics instead. It then sorts the aggregated
+        groups once and calculates net import and export values for both monetary
+        and quantity measures.
 
         Args:
             time_frame (str): The time-based grouping to apply. Must be a key
                 defined in ``TIME_GROUPS``.
             level (str): The classification level to apply. Must be a key defined
                 in ``LEVEL_GROUPS``.
-            base (pl.DataFrame): The base Polars DataFrame containing the trade
-                data to process.
+            base (pl.DataFrame | pl.LazyFrame): The base Polars frame containing
+                the trade data to process.
 
         Returns:
-            pl.DataFrame: A Polars DataFrame grouped and sorted according to the
-                requested time frame and classification level, with missing trade
-                metrics filled with zero and net import/export metrics calculated.
+            pl.DataFrame | pl.LazyFrame: A Polars frame of the same kind as
+                ``base``, grouped and sorted according to the requested time frame
+                and classification level, with net import/export metrics
+                calculated.
 
         Raises:
             ValueError: If ``time_frame`` or ``level`` is not defined in the
@@ -166,72 +1680,107 @@ class JPTrade(TradeUtils):
 
         group_by_keys = TIME_GROUPS[time_frame] + LEVEL_GROUPS[level]
 
-        df = self.filter_data(base, group_by_keys)
-
-        coalesce_exprs = []
-        for col in group_by_keys:
-            right_col = f"{col}_right"
-            if right_col in df.columns:
-                coalesce_exprs.append(
-                    pl.when(pl.col(col).is_null())
-                    .then(pl.col(right_col))
-                    .otherwise(pl.col(col))
-                    .alias(col)
-                )
-
-        if coalesce_exprs:
-            df = df.with_columns(coalesce_exprs)
-
-        df = df.drop([c for c in df.columns if c.endswith("_right")])
-
-        target_metrics = ["imports", "exports", "imports_qty", "exports_qty"]
-        df = (
-            df.with_columns(pl.col(target_metrics).fill_null(0))
-            .sort(group_by_keys)
-            .with_columns(
-                net_exports=pl.col("exports") - pl.col("imports"),
-                net_imports=pl.col("imports") - pl.col("exports"),
-                net_exports_qty=pl.col("exports_qty") - pl.col("imports_qty"),
-                net_imports_qty=pl.col("imports_qty") - pl.col("exports_qty"),
+        if "imports" in base.collect_schema().names():
+            # Already aggregated (e.g. the rollup cube), only needs rolling up
+            df = base.group_by(group_by_keys).agg(
+                pl.sum("imports", "imports_qty", "exports", "exports_qty")
             )
+        else:
+            df = self.filter_data(base, group_by_keys)
+
+        # Compact (categorical) keys are returned and sorted as strings
+        df = df.with_columns(pl.col(pl.Categorical).cast(pl.String))
+        df = df.sort(group_by_keys).with_columns(
+            net_exports=pl.col("exports") - pl.col("imports"),
+            net_imports=pl.col("imports") - pl.col("exports"),
+            net_exports_qty=pl.col("exports_qty") - pl.col("imports_qty"),
+            net_imports_qty=pl.col("imports_qty") - pl.col("exports_qty"),
         )
 
         return df
 
-    def process_price(self, agriculture_filter: bool = False) -> pl.DataFrame:
+    @instrumented
+    def process_price(
+        self,
+        agriculture_filter: bool = False,
+        cache: bool = False,
+        cube: bool = False,
+        grain: Literal["hs2", "hs4", "hs6"] = "hs4",
+        time_frame: Literal["qtr", "monthly"] = "qtr",
+        window: int = 3,
+    ) -> pl.DataFrame:
         """
-        Calculates quarterly price statistics and year-over-year price changes for
+        Calculates price statistics and year-over-year price changes for
         international trade data.
 
-        The method processes trade data at the HTS level with a quarterly time frame,
-        optionally limits the data to agricultural products, and aggregates trade values
-        and quantities to the HS4 classification. Import and export unit prices are
-        calculated from the aggregated values and quantities, and year-over-year
-        percentage changes are computed using a four-quarter lag.
+        The method aggregates the corrected trade data by HTS code and period,
+        then to the HS prefix of ``grain`` in the same lazy query. Import and
+        export unit prices are calculated from the aggregated values and
+        quantities, and every price series is then enriched with window
+        functions over its sorted periods: a rolling mean and standard
+        deviation, the bands two standard deviations around the mean, the rank
+        of the price among all codes of the period, and the year-over-year
+        changes of the price and of its rank.
 
         Args:
             agriculture_filter (bool): If True, limits the underlying trade data to
-                agricultural products where ``agri_prod`` equals 1. Defaults to
-                False.
+                agricultural products, whose HS4 code is listed in
+                ``agr_codes``. Defaults to False.
+            cache (bool): If True, reads the converted base table from the
+                on-disk parquet cache, and caches the prices per grain under
+                ``saving_dir/cache/price/``. Defaults to False.
+            cube (bool): If True, derives the prices from the rollup cube, and
+                caches them like ``cache``. Defaults to False.
+            grain (Literal["hs2", "hs4", "hs6"]): The HS classification level the
+                prices are calculated at. Defaults to ``"hs4"``.
+            time_frame (Literal["qtr", "monthly"]): The period of the prices.
+                Defaults to ``"qtr"``.
+            window (int): The number of periods of the rolling statistics.
+                Defaults to 3.
 
         Returns:
-            pl.DataFrame: A Polars DataFrame containing quarterly HS4-level import and
-                export prices, dates, and year-over-year price percentage changes.
+            pl.DataFrame: A Polars DataFrame containing the import and export
+                prices of every code and period, their rolling mean
+                (``*_mean``), standard deviation (``*_std``), bands
+                (``*_upper``, ``*_lower``), rank (``*_rank``), and year-over-year
+                changes (``*_yoy``, ``*_rank_yoy``).
 
         Note:
-            Year-over-year changes are calculated as a percentage change relative to
-            the same quarter from the prior year (lag of 4 quarters) when sufficient
-            historical data is available.
+            Year-over-year changes are calculated relative to the same period
+            of the prior year (a lag of 4 quarters or 12 months) when
+            sufficient historical data is available. Rank changes are positive
+            when a code moved up the ranking.
         """
-        df = self.process_int_jp(
-            time_frame="qtr",
+        if cache or cube:
+            kind = f"price/{grain}-{time_frame}-w{window}"
+            if agriculture_filter:
+                kind += "-agri"
+            key, cache_dir, stats, _, _ = self._cache_entry(
+                kind=kind, source="org", corrections=True
+            )
+            if cache_dir.exists():
+                return pl.read_parquet(cache_dir / "prices.parquet")
+
+        df = self._query(
+            time_frame=time_frame,
             level="hts",
             agriculture_filter=agriculture_filter,
             source="org",
             corrections=True,
+            lazy=True,
+            cache=cache,
+            cube=cube,
         )
-        df = df.with_columns(
-            hs4=pl.col("hts_code").str.slice(0, 4),
+
+        period = TIME_GROUPS[time_frame][-1]
+        lag = {"qtr": 4, "monthly": 12}[time_frame]
+        if time_frame == "qtr":
+            date = pl.datetime(pl.col("year"), (pl.col("qtr") - 1) * 3 + 1, 1)
+        else:
+            date = pl.datetime(pl.col("year"), pl.col("month"), 1)
+
+        df = df.lazy().with_columns(
+            pl.col("hts_code").str.slice(0, int(grain[2:])).alias(grain),
             imports_qty=pl.when(pl.col("imports_qty") == 0)
             .then(1)
             .otherwise(pl.col("imports_qty")),
@@ -239,111 +1788,134 @@ class JPTrade(TradeUtils):
             .then(1)
             .otherwise(pl.col("exports_qty")),
         )
-        df = df.group_by(pl.col("year", "qtr", "hs4")).agg(
+        df = df.group_by(pl.col("year", period, grain)).agg(
             imports=pl.col("imports").sum(),
             exports=pl.col("exports").sum(),
             imports_qty=pl.col("imports_qty").sum(),
             exports_qty=pl.col("exports_qty").sum(),
         )
-        df = (
-            df.with_columns(
-                price_imports=pl.col("imports") / pl.col("imports_qty"),
-                price_exports=pl.col("exports") / pl.col("exports_qty"),
-                date=pl.datetime(pl.col("year"), (pl.col("qtr") - 1) * 3 + 1, 1),
-            )
-            .sort(["hs4", "date"])
-            .with_columns(
-                # Calculate Year-over-Year (YoY) growth (lag of 4 quarters)
-                price_imports_yoy=pl.col("price_imports").pct_change(4).over("hs4")
-                * 100,
-                price_exports_yoy=pl.col("price_exports").pct_change(4).over("hs4")
-                * 100,
-            )
+        df = df.with_columns(
+            price_imports=pl.col("imports") / pl.col("imports_qty"),
+            price_exports=pl.col("exports") / pl.col("exports_qty"),
+            date=date,
+        ).sort([grain, "date"])
+
+        prices = ["price_imports", "price_exports"]
+        df = df.with_columns(
+            *[
+                (pl.col(p).pct_change(lag).over(grain) * 100).alias(f"{p}_yoy")
+                for p in prices
+            ],
+            *[
+                pl.col(p).rolling_mean(window).over(grain).alias(f"{p}_mean")
+                for p in prices
+            ],
+            *[
+                pl.col(p).rolling_std(window).over(grain).alias(f"{p}_std")
+                for p in prices
+            ],
+            *[
+                pl.col(p).rank("min", descending=True).over("date").alias(f"{p}_rank")
+                for p in prices
+            ],
         )
+        df = df.with_columns(
+            *[
+                (pl.col(f"{p}_mean") + 2 * pl.col(f"{p}_std")).alias(f"{p}_upper")
+                for p in prices
+            ],
+            *[
+                (pl.col(f"{p}_mean") - 2 * pl.col(f"{p}_std")).alias(f"{p}_lower")
+                for p in prices
+            ],
+            *[
+                (pl.col(f"{p}_rank").cast(pl.Int64).shift(lag) - pl.col(f"{p}_rank"))
+                .over(grain)
+                .alias(f"{p}_rank_yoy")
+                for p in prices
+            ],
+        )
+        df = self._collect(df)
 
+        if cache or cube:
+            self._publish_cache(
+                files={"prices.parquet": df}, cache_dir=cache_dir, key=key, stats=stats
+            )
         return df
 
-    def conversion(self, df: pl.DataFrame) -> pl.DataFrame:
+    @instrumented
+    def conversion(
+        self, df: pl.DataFrame | pl.LazyFrame
+    ) -> pl.DataFrame | pl.LazyFrame:
         """
         Converts trade quantity data to standardized units and derives date-based
         fields for downstream aggregation.
 
         The method normalizes quantity measurements from the primary and secondary
         quantity fields into a common kilogram-based representation using the
-        corresponding unit codes. It handles supported units such as kilograms,
-        liters, dozens, cubic meters, metric tons, grams, and other source-specific
-        units. It also derives quarterly, fiscal-year, monthly, and calendar-year
-        fields from the source date and combines the converted quantities into a
-        single ``qty`` field.
+        ``unit_factors`` table. Each unit code is resolved to its factor, preferring
+        a rule for the record's HTS6 code over the unit's generic rule, and the
+        quantity whose unit comes first in the table is used, the primary one on
+        ties. Units can be added with ``register_unit``. It also derives quarterly,
+        fiscal-year, monthly, and calendar-year fields from the source date and
+        combines the converted quantities into a single ``qty`` field.
 
         Args:
-            df (pl.DataFrame): A Polars DataFrame containing the raw trade data.
-                The DataFrame must include quantity, unit, HTS code, and date
-                columns required for the conversion and date-field calculations.
+            df (pl.DataFrame | pl.LazyFrame): A Polars frame containing the raw
+                trade data. The frame must include quantity, unit, HTS code, and
+                date columns required for the conversion and date-field
+                calculations.
 
         Returns:
-            pl.DataFrame: A Polars DataFrame with standardized quantity fields,
-                derived date dimensions, and a combined ``qty`` column representing
-                the converted quantity.
+            pl.DataFrame | pl.LazyFrame: A Polars frame with standardized
+                quantity fields, derived date dimensions, and a combined ``qty``
+                column representing the converted quantity.
         """
-        # Precompute lowercase units and fill nulls efficiently
-        df = df.with_columns(
-            [
-                pl.col("qty_1", "qty_2").fill_null(0),
-                pl.col("unit_1").str.to_lowercase().alias("u1"),
-                pl.col("unit_2").str.to_lowercase().alias("u2"),
-            ]
-        )
-
-        return df.with_columns(
-            qty=pl.when(pl.col("u1") == "kg")
-            .then(pl.col("qty_1"))
-            .when(pl.col("u2") == "kg")
-            .then(pl.col("qty_2"))
-            .when(pl.col("u1") == "gm")
-            .then(pl.col("qty_1") / 1000)
-            .when(pl.col("u2") == "gm")
-            .then(pl.col("qty_2") / 1000)
-            .when(pl.col("u1") == "t")
-            .then(pl.col("qty_1") * 1000)
-            .when(pl.col("u2") == "t")
-            .then(pl.col("qty_2") * 1000)
-            .when(pl.col("u1") == "l")
-            .then(pl.col("qty_1") * 1)
-            .when(pl.col("u2") == "l")
-            .then(pl.col("qty_2") * 1)
-            .when(pl.col("u1") == "doz")
-            .then(pl.col("qty_1") * 0.70874)
-            .when(pl.col("u2") == "doz")
-            .then(pl.col("qty_2") * 0.70874)
-            .when(pl.col("u1") == "m3")
-            .then(pl.col("qty_1") * 353.8322)
-            .when(pl.col("u2") == "m3")
-            .then(pl.col("qty_2") * 353.8322)
-            .when(
-                (pl.col("u1") == "pfl")
-                & (pl.col("hts_code").str.slice(0, 6) == "220710")
-            )
-            .then(pl.col("qty_1") * 0.5556)
-            .when(
-                (pl.col("u2") == "pfl")
-                & (pl.col("hts_code").str.slice(0, 6) == "220710")
+        hts6 = pl.col("hts_code").str.slice(0, 6)
+        priority = {
+            unit: rank
+            for rank, unit in enumerate(
+                self.unit_factors["unit"].unique(maintain_order=True)
             )
-            .then(pl.col("qty_2") * 0.5556)
-            .when(
-                (pl.col("u1") == "pfl")
-                & (pl.col("hts_code").str.slice(0, 6) == "220870")
+        }
+        generic, specific = {}, {}
+        for unit, hts_prefix, factor in self.unit_factors.iter_rows():
+            if hts_prefix is None:
+                generic[unit] = factor
+            else:
+                specific[f"{unit}|{hts_prefix}"] = factor
+
+        # Resolve each unit column to its factor (HTS6-specific rules first) and
+        # to the priority of its unit, null when no rule applies
+        resolved = []
+        for unit_col in ["unit_1", "unit_2"]:
+            unit = pl.col(unit_col).str.to_lowercase()
+            factor = pl.coalesce(
+                (unit + "|" + hts6).replace_strict(
+                    specific, default=None, return_dtype=pl.Float64
+                ),
+                unit.replace_strict(generic, default=None, return_dtype=pl.Float64),
             )
-            .then(pl.col("qty_1") * 2)
-            .when(
-                (pl.col("u2") == "pfl")
-                & (pl.col("hts_code").str.slice(0, 6) == "220870")
+            rank = pl.when(factor.is_not_null()).then(
+                unit.replace_strict(priority, default=None, return_dtype=pl.UInt32)
             )
-            .then(pl.col("qty_2") * 2)
-            .when(pl.col("u1") == "pfl")
-            .then(pl.col("qty_1") * 1.25)
-            .when(pl.col("u2") == "pfl")
-            .then(pl.col("qty_2") * 1.25)
+            resolved += [
+                factor.alias(f"{unit_col}_factor"),
+                rank.alias(f"{unit_col}_rank"),
+            ]
+
+        df = df.with_columns(pl.col("qty_1", "qty_2").fill_null(0), *resolved)
+
+        # The unit with the highest priority wins, unit_1 on ties
+        use_unit_1 = pl.col("unit_1_rank").is_not_null() & (
+            pl.col("unit_2_rank").is_null()
+            | (pl.col("unit_1_rank") <= pl.col("unit_2_rank"))
+        )
+        return df.with_columns(
+            qty=pl.when(use_unit_1)
+            .then(pl.col("qty_1") * pl.col("unit_1_factor"))
+            .when(pl.col("unit_2_rank").is_not_null())
+            .then(pl.col("qty_2") * pl.col("unit_2_factor"))
             .otherwise(None),
             qtr=pl.col("date").dt.quarter(),
             fiscal_year=pl.when(pl.col("date").dt.month() > 6)
@@ -351,74 +1923,172 @@ class JPTrade(TradeUtils):
             .otherwise(pl.col("date").dt.year()),
             month=pl.col("date").dt.month(),
             year=pl.col("date").dt.year(),
-        ).drop(["u1", "u2"])
+        ).drop(["unit_1_factor", "unit_1_rank", "unit_2_factor", "unit_2_rank"])
 
-    def filter_data(self, df: pl.DataFrame, filter: list) -> pl.DataFrame:
+    @instrumented
+    def filter_data(
+        self, df: pl.DataFrame | pl.LazyFrame, filter: list
+    ) -> pl.DataFrame | pl.LazyFrame:
         """
         Aggregates import and export data according to the specified grouping
-        fields and combines the resulting trade measures into a single DataFrame.
+        fields in a single pass over the data.
 
-        The method first excludes records without an HTS code, then separates the
-        data into imports and exports using the ``trade_id`` field. Each trade type
-        is grouped by the provided filter columns and aggregated for both trade
-        value and quantity. The resulting import and export DataFrames are then
-        joined using the grouping fields, preserving records that exist in either
-        trade type.
+        The method first excludes records without an HTS code, then groups the
+        remaining records by the provided filter columns once, computing the trade
+        value and quantity for imports and exports as conditional sums on the
+        ``trade_id`` field. Groups with no records for one of the trade types get
+        zero for that trade type's measures.
 
         Args:
-            df (pl.DataFrame): A Polars DataFrame containing the trade data. The
-                DataFrame must include ``hts_code``, ``trade_id``, ``data``, and
-                ``qty`` columns.
+            df (pl.DataFrame | pl.LazyFrame): A Polars frame containing the trade
+                data. The frame must include ``hts_code``, ``trade_id``, ``data``,
+                and ``qty`` columns.
             filter (list): A list of column names used to group and aggregate the
                 trade data.
 
         Returns:
-            pl.DataFrame: A Polars DataFrame containing aggregated import and export
-                values and quantities, grouped according to the provided filter
-                columns.
+            pl.DataFrame | pl.LazyFrame: A Polars frame containing aggregated
+                import and export values and quantities, grouped according to the
+                provided filter columns.
         """
-        df = df.filter(pl.col("hts_code").is_not_null())
-        imports = (
-            df.filter(pl.col("trade_id") == 1)
-            .group_by(filter)
-            .agg(pl.sum("data", "qty"))
-            .sort(filter)
-            .rename({"data": "imports", "qty": "imports_qty"})
-        )
-        exports = (
-            df.filter(pl.col("trade_id") == 2)
+        is_import = pl.col("trade_id") == 1
+        is_export = pl.col("trade_id") == 2
+        return (
+            df.filter(pl.col("hts_code").is_not_null() & (is_import | is_export))
             .group_by(filter)
-            .agg(pl.sum("data", "qty"))
-            .sort(filter)
-            .rename({"data": "exports", "qty": "exports_qty"})
+            .agg(
+                imports=pl.col("data").filter(is_import).sum(),
+                imports_qty=pl.col("qty").filter(is_import).sum(),
+                exports=pl.col("data").filter(is_export).sum(),
+                exports_qty=pl.col("qty").filter(is_export).sum(),
+            )
         )
-        return imports.join(exports, on=filter, how="full")
 
-    def corrections(self, df: pl.DataFrame) -> pl.DataFrame:
-        df = df.with_columns(
-            qty_1=pl.when(
-                (pl.col("date").dt.year() == 2007)  # 2007 SOYBEAN OILCAKE Correction
-                & (pl.col("date").dt.month() == 3)
-                & (pl.col("qty_1") == 7540542599)
-                & (pl.col("hts_code") == "2304000000")
+    @instrumented
+    def corrections(
+        self, df: pl.DataFrame | pl.LazyFrame
+    ) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Applies the ``correction_rules`` to known bad records.
+
+        The rules of every corrected column are joined to the data on the HTS
+        code, the year and month of the record, and the original value of the
+        column, plus the country for the rules scoped to one, so a rule only
+        costs a hash lookup per record regardless of the number of rules, and
+        only the matching records are changed.
+
+        Args:
+            df (pl.DataFrame | pl.LazyFrame): The raw trade data.
+
+        Returns:
+            pl.DataFrame | pl.LazyFrame: The corrected trade data.
+        """
+
+        def matched(suffix: str) -> pl.Expr:
+            exclude_country = pl.col(f"rule_exclude_country{suffix}")
+            return pl.col(f"rule_new_value{suffix}").is_not_null() & (
+                exclude_country.is_null() | (pl.col("country") != exclude_country)
             )
-            .then(pl.lit(10648031))
-            .when(
-                (pl.col("date").dt.year() == 2008)
-                & (pl.col("date").dt.month() == 6)
-                & (pl.col("qty_1") == 5000000)
-                & (pl.col("hts_code") == "2714900000")
+
+        schema = df.collect_schema()
+        for (column,), rules in self.correction_rules.group_by(
+            "column", maintain_order=True
+        ):
+            rules = rules.select(
+                pl.col("hts_code").cast(schema["hts_code"]).alias("rule_hts_code"),
+                pl.col("year").alias("rule_year"),
+                pl.col("month").alias("rule_month"),
+                pl.col("value").cast(schema[column]).alias("rule_value"),
+                pl.col("country").cast(schema["country"]).alias("rule_country"),
+                pl.col("exclude_country").alias("rule_exclude_country"),
+                pl.col("new_value").cast(schema[column]).alias("rule_new_value"),
             )
-            .then(pl.lit(50000))
-            .otherwise(pl.col("qty_1")),
-            unit_1=pl.when(
-                (pl.col("date").dt.year() >= 2012)
-                & (pl.col("date").dt.year() <= 2017)
-                & (pl.col("unit_1") == "t")
-                & (pl.col("country") != "united states")
-                & (pl.col("hts_code") == "1004900000")
+            # Rules scoped to a country are also joined on it, so they can share
+            # their records with a rule for every other country
+            specific = rules.filter(pl.col("rule_country").is_not_null())
+            broad = rules.filter(pl.col("rule_country").is_null())
+            if isinstance(df, pl.LazyFrame):
+                specific, broad = specific.lazy(), broad.lazy()
+            keys = [
+                pl.col("hts_code"),
+                pl.col("date").dt.year(),
+                pl.col("date").dt.month(),
+                pl.col(column),
+            ]
+            rule_keys = ["rule_hts_code", "rule_year", "rule_month", "rule_value"]
+
+            df = (
+                df.join(
+                    specific,
+                    left_on=[*keys, pl.col("country")],
+                    right_on=[*rule_keys, "rule_country"],
+                    how="left",
+                    coalesce=False,
+                    maintain_order="left",
+                )
+                .join(
+                    broad,
+                    left_on=keys,
+                    right_on=rule_keys,
+                    how="left",
+                    coalesce=False,
+                    maintain_order="left",
+                    suffix="_broad",
+                )
+                .with_columns(
+                    pl.when(matched(""))
+                    .then(pl.col("rule_new_value"))
+                    .when(matched("_broad"))
+                    .then(pl.col("rule_new_value_broad"))
+                    .otherwise(pl.col(column))
+                    .alias(column)
+                )
+                .select(schema.names())
             )
-            .then(pl.lit("kg"))
-            .otherwise(pl.col("unit_1")),
-        )
         return df
+
+
+# State of the process_parallel worker processes
+_worker_trade = None
+
+
+def _init_worker(
+    saving_dir: Path,
+    log_file: str,
+    unit_factors: pl.DataFrame,
+    correction_rules: pl.DataFrame,
+    max_memory: int | None,
+) -> None:
+    global _worker_trade
+
+    if max_memory is not None:
+        try:
+            import resource
+        except ImportError:
+            logging.warning("max_memory is not supported on this platform")
+        else:
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    _worker_trade = JPTrade(saving_dir=saving_dir, log_file=log_file)
+    _worker_trade.unit_factors = unit_factors
+    _worker_trade.correction_rules = correction_rules
+
+
+def _aggregate_partition(files: list[str], spec: dict) -> tuple[pl.DataFrame, bool]:
+    """
+    Sums one partition of raw files to the keys of a ``process_parallel`` query,
+    also returning whether any row matched its level filter.
+    """
+    df = pl.scan_parquet(files)
+    if spec["agriculture_filter"]:
+        df = _worker_trade.filter_agriculture(df)
+    if spec["corrections"]:
+        df = _worker_trade.corrections(df=df)
+
+    matched = True
+    if spec["level_filter"] is not None:
+        df = df.filter(pl.col(spec["filter_col"]).str.starts_with(spec["level_filter"]))
+        matched = not df.select(spec["filter_col"]).head(1).collect().is_empty()
+
+    df = JPTrade._date_filter(df, spec["datetime"])
+    df = _worker_trade.filter_data(_worker_trade.conversion(df), spec["keys"])
+    return df.collect(), matched
@@ -0,0 +1,188 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+from typing import Any
+
+import polars as pl
+
+
+def rss() -> int:
+    """Returns the resident set size of the process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak rather than current size, the best available without /proc
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+class PeakMemory:
+    """Samples the resident set size in a thread while the context is open."""
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.start = self.peak = 0
+        self._done = threading.Event()
+
+    def __enter__(self) -> "PeakMemory":
+        self.start = self.peak = rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss())
+
+    @property
+    def peak_mb(self) -> float:
+        """The peak memory above the size at the start, in MiB."""
+        return (self.peak - self.start) / 2**20
+
+    def _sample(self) -> None:
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss())
+
+
+def _rows(df: Any) -> int | None:
+    return df.height if isinstance(df, pl.DataFrame) else None
+
+
+# Profile of the call running in the current thread or task, so calls running
+# concurrently on a shared JPTrade each get their own record
+_active: ContextVar["Profile | None"] = ContextVar("jp_imports_profile", default=None)
+
+
+def collect(df: pl.LazyFrame) -> pl.DataFrame:
+    """Collects a lazy query, profiling it when the current call is profiled."""
+    profile = _active.get()
+    if profile is None:
+        return df.collect()
+    return profile.collect(df)
+
+
+class Profile:
+    """
+    The record of one profiled ``JPTrade`` call and the stages it went through.
+
+    Every stage stores its nesting ``depth``, wall time, peak memory, and the row
+    counts of its input and output frames when they are eager. A stage returning
+    a ``LazyFrame`` only builds a query plan, so it is flagged ``lazy`` and its
+    time and memory cover the plan building alone. Lazy queries are executed
+    through ``collect``, which stores their optimized plan and the per-node
+    timings reported by Polars where available.
+    """
+
+    def __init__(self, call: str, params: dict[str, Any]) -> None:
+        self.record = {
+            "event": "jp_imports.profile",
+            "call": call,
+            "params": params,
+            "stages": [],
+        }
+        self._depth = 0
+
+    def stage(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        """Runs ``func`` as a stage of the call."""
+        rows_in = next(
+            (
+                arg.height
+                for arg in (*args, *kwargs.values())
+                if isinstance(arg, pl.DataFrame)
+            ),
+            None,
+        )
+        stage = {"stage": name, "depth": self._depth}
+        self.record["stages"].append(stage)
+        self._depth += 1
+        try:
+            with PeakMemory() as memory:
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                seconds = time.perf_counter() - start
+        finally:
+            self._depth -= 1
+        stage.update(
+            seconds=seconds,
+            peak_mb=memory.peak_mb,
+            rows_in=rows_in,
+            rows_out=_rows(result),
+            lazy=isinstance(result, pl.LazyFrame),
+        )
+        return result
+
+    def collect(self, df: pl.LazyFrame) -> pl.DataFrame:
+        """
+        Collects a lazy query as a stage, capturing its plan and, on Polars
+        versions that still have ``LazyFrame.profile``, its node timings.
+        """
+        self.record["plan"] = df.explain()
+        try:
+            profile = df.profile
+        except AttributeError:
+            return self.stage("collect", df.collect)
+
+        df, nodes = self.stage("collect", profile)
+        self.record["nodes"] = nodes.to_dicts()
+        self.record["stages"][-1]["rows_out"] = df.height
+        return df
+
+    def finish(self, seconds: float, peak_mb: float, result: Any) -> dict[str, Any]:
+        self.record.update(seconds=seconds, peak_mb=peak_mb, rows=_rows(result))
+        return self.record
+
+
+def instrumented(method: Callable) -> Callable:
+    """
+    Profiles a ``JPTrade`` method when its ``profile`` attribute is set.
+
+    The outermost instrumented call opens a ``Profile`` that every nested
+    instrumented call of the same thread or task is recorded in as a stage.
+    When the call returns, the record is passed to every callback of ``hooks``
+    and logged as one JSON line.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.profile:
+            return method(self, *args, **kwargs)
+        profile = _active.get()
+        if profile is not None:
+            name = method.__name__.lstrip("_")
+            return profile.stage(name, method, self, *args, **kwargs)
+
+        bound = inspect.signature(method).bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = {
+            key: value
+            for key, value in list(bound.arguments.items())[1:]
+            if isinstance(value, (str, int, float, bool, type(None)))
+        }
+        profile = Profile(method.__name__.lstrip("_"), params)
+        token = _active.set(profile)
+        try:
+            with PeakMemory() as memory:
+                start = time.perf_counter()
+                result = method(self, *args, **kwargs)
+                seconds = time.perf_counter() - start
+            record = profile.finish(seconds, memory.peak_mb, result)
+        finally:
+            _active.reset(token)
+
+        logging.info(json.dumps(record, default=str))
+        for hook in self.hooks:
+            hook(record)
+        return result
+
+    return wrapper
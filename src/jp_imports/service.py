@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Literal
+
+import polars as pl
+
+from .jp_imports import JPTrade
+
+# JPTrade instances of the executor workers, one per thread and factory
+_local = threading.local()
+
+
+def _run(factory: Callable[[], JPTrade], query: dict[str, Any]) -> pl.DataFrame:
+    """Runs a ``process_int_jp`` query on the worker's own ``JPTrade``."""
+    trades = _local.__dict__.setdefault("trades", {})
+    if factory not in trades:
+        trades[factory] = factory()
+    return trades[factory].process_int_jp(**query)
+
+
+class QueryService:
+    """
+    Asyncio front end of ``JPTrade.process_int_jp`` for serving concurrent
+    requests.
+
+    Queries run in an executor so the event loop is never blocked. Every worker
+    builds its own ``JPTrade`` with ``factory``, which keeps the DuckDB cursors
+    per thread and lets tests pass a stand-in for the data pull. Identical
+    queries in flight at the same time share a single run, and results are kept
+    in an LRU cache bounded by entry count, total size, and age.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], JPTrade] = JPTrade,
+        max_workers: int | None = None,
+        executor: Executor | None = None,
+        max_entries: int = 128,
+        max_bytes: int | None = None,
+        ttl: float | None = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            factory (Callable[[], JPTrade]): Builds the ``JPTrade`` of a worker,
+                e.g. ``functools.partial(JPTrade, saving_dir="data/")``. Must be
+                picklable with a process pool ``executor``. Defaults to
+                ``JPTrade``.
+            max_workers (int | None): The number of threads of the default
+                executor. Defaults to the ``ThreadPoolExecutor`` default.
+            executor (Executor | None): The executor to run the queries in,
+                owned by the caller. Defaults to a thread pool owned by the
+                service.
+            max_entries (int): The maximum number of cached results. Defaults to
+                128.
+            max_bytes (int | None): The maximum estimated size of the cached
+                results. Defaults to no limit.
+            ttl (float | None): The number of seconds a result stays cached.
+                Defaults to 300, None keeps results until evicted.
+            clock (Callable[[], float]): The clock the ages are measured with.
+                Defaults to ``time.monotonic``.
+        """
+        self.factory = factory
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="jp-imports"
+        )
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._cache: OrderedDict[tuple, tuple[float, int, pl.DataFrame]] = OrderedDict()
+        self._cache_bytes = 0
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    async def __aenter__(self) -> "QueryService":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    async def query(
+        self,
+        level: Literal["hts", "naics", "country", "total"],
+        time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+        datetime: str = "",
+        agriculture_filter: bool = False,
+        corrections: bool = False,
+        source: Literal["jp", "org"] = "org",
+        level_filter: str = "",
+        lazy: bool = False,
+        cache: bool = False,
+        cube: bool = False,
+        snapshot: bool = False,
+    ) -> pl.DataFrame:
+        """
+        Returns the result of a ``process_int_jp`` query, from the result cache
+        or a run shared with the identical queries in flight.
+
+        Args:
+            level (Literal["hts", "naics", "country", "total"]): The aggregation
+                level, as in ``process_int_jp``.
+            time_frame (Literal["yearly", "fiscal", "qtr", "monthly"]): The time
+                frame, as in ``process_int_jp``.
+            datetime (str): Optional date filter, as in ``process_int_jp``.
+            agriculture_filter (bool): If True, limits the data to agricultural
+                products. Defaults to False.
+            corrections (bool): If True, applies ``corrections``. Defaults to
+                False.
+            source (Literal["jp", "org"]): The source of the international trade
+                data. Defaults to ``"org"``.
+            level_filter (str): Optional prefix of the selected taxonomy level,
+                as in ``process_int_jp``.
+            lazy (bool): Passed to ``process_int_jp``. Defaults to False.
+            cache (bool): Passed to ``process_int_jp``. Defaults to False.
+            cube (bool): Passed to ``process_int_jp``. Defaults to False.
+            snapshot (bool): Passed to ``process_int_jp``. Defaults to False.
+
+        Returns:
+            pl.DataFrame: The result of the query. It is shared with the other
+                callers of the same query, so it must not be modified in place.
+
+        Raises:
+            ValueError: If the query fails validation in ``process_int_jp``.
+        """
+        query = {
+            "level": level,
+            "time_frame": time_frame,
+            "datetime": datetime,
+            "agriculture_filter": agriculture_filter,
+            "corrections": corrections,
+            "source": source,
+            "level_filter": level_filter,
+            "lazy": lazy,
+            "cache": cache,
+            "cube": cube,
+            "snapshot": snapshot,
+        }
+        key = tuple(query.items())
+
+        df = self._get(key)
+        if df is not None:
+            self.stats["hits"] += 1
+            return df
+
+        future = self._inflight.get(key)
+        if future is None:
+            self.stats["misses"] += 1
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, _run, self.factory, query)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.stats["coalesced"] += 1
+
+        # A cancelled caller must not cancel the run shared with other callers
+        return await asyncio.shield(future)
+
+    def clear(self) -> None:
+        """Drops every cached result."""
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def close(self) -> None:
+        """Shuts down the executor when it is owned by the service."""
+        if self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get(self, key: tuple) -> pl.DataFrame | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        created, size, df = entry
+        if self.ttl is not None and self.clock() - created > self.ttl:
+            del self._cache[key]
+            self._cache_bytes -= size
+            return None
+        self._cache.move_to_end(key)
+        return df
+
+    def _finish(self, key: tuple, future: asyncio.Future) -> None:
+        """Caches the result of a finished run and evicts the stale entries."""
+        del self._inflight[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        df = future.result()
+        size = df.estimated_size()
+        if key in self._cache:
+            self._cache_bytes -= self._cache.pop(key)[1]
+        self._cache[key] = (self.clock(), size, df)
+        self._cache_bytes += size
+        while self._cache and (
+            len(self._cache) > self.max_entries
+            or (self.max_bytes is not None and self._cache_bytes > self.max_bytes)
+        ):
+            _, (_, evicted, _) = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted
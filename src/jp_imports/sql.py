@@ -0,0 +1,259 @@
+from datetime import datetime as dt
+from typing import Literal
+
+import duckdb
+import polars as pl
+
+from .jp_imports import LEVEL_GROUPS, TIME_GROUPS, load_agr_codes, load_unit_factors
+
+SOURCE_TABLES = {"org": "inttradedata", "jp": "jptradedata"}
+
+# SQL equivalents of the date fields derived in JPTrade.conversion
+TIME_COLUMNS = {
+    "year": "CAST(year(date) AS INTEGER)",
+    "fiscal_year": (
+        "CAST(CASE WHEN month(date) > 6 THEN year(date) + 1 ELSE year(date) END "
+        "AS INTEGER)"
+    ),
+    "qtr": "CAST(quarter(date) AS TINYINT)",
+    "month": "CAST(month(date) AS TINYINT)",
+}
+
+# Columns of the correction rules joined by corrections_relation, with their type
+RULE_COLUMNS = {
+    "hts_code": "VARCHAR",
+    "year": "INTEGER",
+    "month": "INTEGER",
+    "country": "VARCHAR",
+    "exclude_country": "VARCHAR",
+    "value": "VARCHAR",
+    "new_value": "VARCHAR",
+}
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def qty_column(unit_factors: pl.DataFrame) -> str:
+    """
+    Builds the SQL equivalent of the quantity conversion in JPTrade.conversion
+    from a unit conversion table, the first matching rule wins.
+    """
+    rules = []
+    for unit in unit_factors["unit"].unique(maintain_order=True):
+        unit_rules = unit_factors.filter(pl.col("unit") == unit).sort(
+            "hts6", nulls_last=True
+        )
+        for side in ["1", "2"]:
+            for _, hts6, factor in unit_rules.iter_rows():
+                condition = f"lower(unit_{side}) = {sql_literal(unit)}"
+                if hts6 is not None:
+                    condition += f" AND substr(hts_code, 1, 6) = {sql_literal(hts6)}"
+                rules.append(
+                    f"WHEN {condition} THEN COALESCE(qty_{side}, 0) * {factor!r}"
+                )
+
+    return f"CASE {' '.join(rules)} ELSE NULL END::DOUBLE"
+
+
+def date_conditions(
+    datetime: str, date: str = "date", year: str = "year(date)"
+) -> tuple[list[str], list]:
+    """
+    Builds the SQL conditions of a ``process_int_jp`` date filter on the ``date``
+    and ``year`` expressions. A range is also bounded on ``year``, so a year
+    partition column can prune the files outside of it.
+    """
+    if not datetime:
+        return [], []
+    times = datetime.split("+")
+    if len(times) == 2:
+        start, end = (dt.strptime(time, "%Y-%m-%d") for time in times)
+        return (
+            [f"{date} BETWEEN ? AND ?", f"{year} BETWEEN ? AND ?"],
+            [start, end, start.year, end.year],
+        )
+    if len(times) == 1:
+        return [f"{year} = ?"], [int(datetime)]
+    raise ValueError('Invalid time format. Use "date" or "start_date+end_date"')
+
+
+def corrections_relation(
+    conn: duckdb.DuckDBPyConnection, relation: str, rules: pl.DataFrame
+) -> tuple[str, list]:
+    """
+    Builds the SQL equivalent of JPTrade.corrections over ``relation``.
+
+    The rules of every corrected column are passed as parameters and joined to
+    the records like in ``corrections``: the rules scoped to a country on the
+    country too, the others on the HTS code, month, and value alone.
+
+    Returns:
+        tuple[str, list]: The corrected relation and its parameters.
+    """
+    empty = conn.sql(f"SELECT * FROM {relation} LIMIT 0")
+    types = dict(zip(empty.columns, map(str, empty.types)))
+    lookup = ", ".join(
+        f"unnest(?::{kind}[]) AS {col}" for col, kind in RULE_COLUMNS.items()
+    )
+    params = []
+    for (column,), column_rules in rules.group_by("column", maintain_order=True):
+        kind = types[column]
+        for scoped in [pl.col("country").is_not_null(), pl.col("country").is_null()]:
+            scope_rules = column_rules.filter(scoped)
+            params += [scope_rules[col].to_list() for col in RULE_COLUMNS]
+
+        on = {
+            name: (
+                f"{name}.hts_code = t.hts_code "
+                f"AND {name}.year = year(t.date) "
+                f"AND {name}.month = month(t.date) "
+                f"AND CAST({name}.value AS {kind}) = t.{column} "
+                f"AND ({name}.exclude_country IS NULL "
+                f"OR t.country <> {name}.exclude_country)"
+            )
+            for name in ["specific", "broad"]
+        }
+
+        relation = f"""(
+            SELECT t.* REPLACE (
+                COALESCE(
+                    CAST(specific.new_value AS {kind}),
+                    CAST(broad.new_value AS {kind}),
+                    t.{column}
+                ) AS {column}
+            )
+            FROM {relation} AS t
+            LEFT JOIN (SELECT {lookup}) AS specific
+                ON {on["specific"]} AND specific.country = t.country
+            LEFT JOIN (SELECT {lookup}) AS broad ON {on["broad"]}
+        )"""
+    return relation, params
+
+
+def process_int_sql(
+    conn: duckdb.DuckDBPyConnection,
+    relation: str,
+    level: Literal["hts", "naics", "country", "total"],
+    time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+    datetime: str = "",
+    agriculture_filter: bool = False,
+    level_filter: str = "",
+    unit_factors: pl.DataFrame | None = None,
+    agr_codes: pl.DataFrame | None = None,
+    correction_rules: pl.DataFrame | None = None,
+) -> pl.DataFrame:
+    """
+    Runs JPTrade.process_int_jp as a single DuckDB query over raw trade records.
+
+    Corrections, filtering, unit conversion, the import/export split and the
+    aggregation all happen inside DuckDB, so only the aggregated result is
+    handed to Polars through Arrow.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): The connection to run the query on.
+        relation (str): The SQL relation holding the raw records, a table name
+            or a table function such as ``read_parquet(...)``.
+        level (Literal["hts", "naics", "country", "total"]): The aggregation
+            level, as in ``process_int_jp``.
+        time_frame (Literal["yearly", "fiscal", "qtr", "monthly"]): The time
+            frame, as in ``process_int_jp``.
+        datetime (str): Optional date filter, as in ``process_int_jp``.
+        agriculture_filter (bool): If True, limits the data to the records whose
+            HS4 code is in ``agr_codes``. Defaults to False.
+        level_filter (str): Optional prefix of the selected taxonomy level, as
+            in ``process_int_jp``.
+        unit_factors (pl.DataFrame | None): The unit conversion table. Defaults
+            to the package's table, pass ``JPTrade.unit_factors`` to use
+            registered units.
+        agr_codes (pl.DataFrame | None): The HS4 codes of agricultural products.
+            Defaults to ``load_agr_codes``.
+        correction_rules (pl.DataFrame | None): The correction rules to apply,
+            as loaded by ``load_corrections``. Defaults to no corrections.
+
+    Returns:
+        pl.DataFrame: The same DataFrame ``process_int_jp`` returns.
+
+    Raises:
+        ValueError: If the level or time frame is invalid, ``level_filter`` does
+            not match any records, or ``datetime`` is malformed.
+    """
+    if time_frame not in TIME_GROUPS or level not in LEVEL_GROUPS:
+        raise ValueError(
+            f"Invalid combination layout requested: {time_frame=}, {level=}"
+        )
+
+    if unit_factors is None:
+        unit_factors = load_unit_factors()
+    if agr_codes is None:
+        agr_codes = load_agr_codes()
+
+    params = []
+    if correction_rules is not None and not correction_rules.is_empty():
+        relation, params = corrections_relation(conn, relation, correction_rules)
+
+    group_by_keys = TIME_GROUPS[time_frame] + LEVEL_GROUPS[level]
+    conditions, condition_params = [], []
+
+    if agriculture_filter:
+        # Semi-join of the HS4 code on the agricultural code list
+        conditions.append("substr(hts_code, 1, 4) IN (SELECT unnest(?::VARCHAR[]))")
+        condition_params.append(agr_codes["hs4"].to_list())
+
+    if level in ["hts", "naics", "country"]:
+        filter_col = LEVEL_GROUPS[level][0]
+        conditions.append(f"starts_with({filter_col}, ?)")
+        condition_params.append(level_filter)
+
+        matched = conn.execute(
+            f"SELECT 1 FROM {relation} WHERE {' AND '.join(conditions)} LIMIT 1;",
+            params + condition_params,
+        ).fetchone()
+        if matched is None:
+            raise ValueError(f"Invalid {level.upper()} code: {level_filter}")
+
+    date_filters, date_params = date_conditions(datetime)
+    conditions += date_filters
+    condition_params += date_params
+
+    conditions += ["hts_code IS NOT NULL", "trade_id IN (1, 2)"]
+    key_columns = [
+        f"{TIME_COLUMNS[col]} AS {col}" if col in TIME_COLUMNS else col
+        for col in group_by_keys
+    ]
+    keys = ", ".join(group_by_keys)
+    order = ", ".join(f"{col} NULLS FIRST" for col in group_by_keys)
+    qty = qty_column(unit_factors)
+
+    query = f"""
+        WITH base AS (
+            SELECT {", ".join(key_columns)}, trade_id, data, {qty} AS qty
+            FROM {relation}
+            WHERE {" AND ".join(conditions)}
+        ),
+        totals AS (
+            SELECT
+                {keys},
+                COALESCE(SUM(data) FILTER (WHERE trade_id = 1), 0)::BIGINT
+                    AS imports,
+                COALESCE(SUM(qty) FILTER (WHERE trade_id = 1), 0)
+                    AS imports_qty,
+                COALESCE(SUM(data) FILTER (WHERE trade_id = 2), 0)::BIGINT
+                    AS exports,
+                COALESCE(SUM(qty) FILTER (WHERE trade_id = 2), 0)
+                    AS exports_qty
+            FROM base
+            GROUP BY {keys}
+        )
+        SELECT
+            *,
+            exports - imports AS net_exports,
+            imports - exports AS net_imports,
+            exports_qty - imports_qty AS net_exports_qty,
+            imports_qty - exports_qty AS net_imports_qty
+        FROM totals
+        ORDER BY {order};
+    """
+
+    return conn.execute(query, params + condition_params).pl()
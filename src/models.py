@@ -1,8 +1,103 @@
+import glob
+import logging
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Literal
+
 import duckdb
+import polars as pl
+import pyarrow as pa
+
+from jp_imports.database import connections
+from jp_imports.jp_imports import LEVEL_GROUPS, TIME_GROUPS
+from jp_imports.sql import (
+    SOURCE_TABLES,
+    TIME_COLUMNS,
+    date_conditions,
+    process_int_sql,
+    sql_literal,
+)
+
+LoadData = (
+    str | Path | list[str | Path] | pa.Table | pa.RecordBatchReader | pl.DataFrame
+)
+
+# Partition replaced as a whole by load_trade_data, so reloading a month is
+# idempotent. Comtrade pulls are per reporter, so a reporter's period is the unit.
+LOAD_PARTITIONS = {
+    "inttradedata": "strftime(date, '%Y-%m')",
+    "jptradedata": "strftime(date, '%Y-%m')",
+    "comtradetable": "concat_ws('|', freqCode, reporterCode, period)",
+}
+
+# Closed Comtrade code lists, stored as enums
+COMTRADE_ENUMS = {
+    "comtrade_type": ["C", "S"],
+    "comtrade_freq": ["A", "M"],
+    "comtrade_flow": [
+        "M", "X", "RM", "RX", "DX", "FM", "MIP", "XIP", "MOP", "XOP", "MIF", "XIF",
+    ],
+}  # fmt: skip
+
+COMTRADE_COLUMNS = {
+    "typeCode": "comtrade_type",
+    "freqCode": "comtrade_freq",
+    "refPeriodId": "INTEGER",
+    "refYear": "SMALLINT",
+    "refMonth": "TINYINT",
+    "period": "INTEGER",
+    "reporterCode": "SMALLINT",
+    "reporterISO": "VARCHAR",
+    "reporterDesc": "VARCHAR",
+    "flowCode": "comtrade_flow",
+    "flowDesc": "VARCHAR",
+    "partnerCode": "SMALLINT",
+    "partnerISO": "VARCHAR",
+    "partnerDesc": "VARCHAR",
+    "partner2Code": "SMALLINT",
+    "partner2ISO": "VARCHAR",
+    "partner2Desc": "VARCHAR",
+    "classificationCode": "VARCHAR",
+    "classificationSearchCode": "VARCHAR",
+    "isOriginalClassification": "BOOLEAN",
+    "cmdCode": "VARCHAR",
+    "cmdDesc": "VARCHAR",
+    "aggrLevel": "TINYINT",
+    "isLeaf": "BOOLEAN",
+    "customsCode": "VARCHAR",
+    "customsDesc": "VARCHAR",
+    "mosCode": "SMALLINT",
+    "motCode": "SMALLINT",
+    "motDesc": "VARCHAR",
+    "qtyUnitCode": "SMALLINT",
+    "qtyUnitAbbr": "VARCHAR",
+    "qty": "DOUBLE",
+    "isQtyEstimated": "BOOLEAN",
+    "altQtyUnitCode": "SMALLINT",
+    "altQtyUnitAbbr": "VARCHAR",
+    "altQty": "DOUBLE",
+    "isAltQtyEstimated": "BOOLEAN",
+    "netWgt": "DOUBLE",
+    "isNetWgtEstimated": "BOOLEAN",
+    "grossWgt": "DOUBLE",
+    "isGrossWgtEstimated": "BOOLEAN",
+    "cifvalue": "DOUBLE",
+    "fobvalue": "DOUBLE",
+    "primaryValue": "DOUBLE",
+    "legacyEstimationFlag": "TINYINT",
+    "isReported": "BOOLEAN",
+    "isAggregate": "BOOLEAN",
+}
 
+# M49 code of Puerto Rico, the partner of the mirrored flows
+PR_CODE = 630
 
-def get_conn(db_path: str) -> duckdb.DuckDBPyConnection:
-    return duckdb.connect(db_path)
+
+def get_conn(db_path: str, read_only: bool = False) -> duckdb.DuckDBPyConnection:
+    # Shared per-thread cursor, owned by the pool and never closed by callers
+    return connections.cursor(db_path=db_path, read_only=read_only)
 
 
 def init_int_trade_data_table(db_path: str) -> None:
@@ -54,57 +149,336 @@ def init_jp_trade_data_table(db_path: str) -> None:
 
 
 def init_com_trade_data_table(db_path: str) -> None:
+    """
+    Creates the typed Comtrade table, converting a table left by the older all
+    ``VARCHAR`` layout in place.
+
+    Periods and country codes are integers, closed code lists are enums and the
+    ``is*`` flags are booleans, so filters and joins on them need no casts.
+    Values are doubles since trade values overflow the precision of a float.
+    """
     conn = get_conn(db_path=db_path)
-    conn.sql(
+    for name, values in COMTRADE_ENUMS.items():
+        labels = ", ".join(sql_literal(value) for value in values)
+        conn.sql(f"CREATE TYPE IF NOT EXISTS {name} AS ENUM ({labels});")
+
+    columns = ",\n".join(f"{col} {kind}" for col, kind in COMTRADE_COLUMNS.items())
+    legacy = conn.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'comtradetable'
+            AND column_name = 'refYear'
+            AND data_type = 'VARCHAR';
         """
-        CREATE TABLE IF NOT EXISTS "comtradetable" (
-            typeCode VARCHAR(255),
-            freqCode VARCHAR(255),
-            refPeriodId VARCHAR(255),
-            refYear VARCHAR(255),
-            refMonth VARCHAR(255),
-            period VARCHAR(255),
-            reporterCode VARCHAR(255),
-            reporterISO VARCHAR(255),
-            reporterDesc VARCHAR(255),
-            flowCode VARCHAR(255),
-            flowDesc VARCHAR(255),
-            partnerCode VARCHAR(255),
-            partnerISO VARCHAR(255),
-            partnerDesc VARCHAR(255),
-            partner2Code VARCHAR(255),
-            partner2ISO VARCHAR(255),
-            partner2Desc VARCHAR(255),
-            classificationCode VARCHAR(255),
-            classificationSearchCode VARCHAR(255),
-            isOriginalClassification VARCHAR(255),
-            cmdCode VARCHAR(255),
-            cmdDesc VARCHAR(255),
-            aggrLevel VARCHAR(255),
-            isLeaf VARCHAR(255),
-            customsCode VARCHAR(255),
-            customsDesc VARCHAR(255),
-            mosCode VARCHAR(255),
-            motCode VARCHAR(255),
-            motDesc VARCHAR(255),
-            qtyUnitCode VARCHAR(255),
-            qtyUnitAbbr VARCHAR(255),
-            qty FLOAT,
-            isQtyEstimated VARCHAR(255),
-            altQtyUnitCode VARCHAR(255),
-            altQtyUnitAbbr VARCHAR(255),
-            altQty FLOAT,
-            isAltQtyEstimated VARCHAR(255),
-            netWgt FLOAT,
-            isNetWgtEstimated VARCHAR(255),
-            grossWgt FLOAT,
-            isGrossWgtEstimated VARCHAR(255),
-            cifvalue FLOAT,
-            fobvalue FLOAT,
-            primaryValue FLOAT,
-            legacyEstimationFlag VARCHAR(255),
-            isReported VARCHAR(255),
-            isAggregate VARCHAR(255)
-            );
+    ).fetchone()
+    if legacy is None:
+        conn.sql(f'CREATE TABLE IF NOT EXISTS "comtradetable" ({columns});')
+        return
+
+    conn.begin()
+    try:
+        conn.sql('ALTER TABLE "comtradetable" RENAME TO "comtradetable_legacy";')
+        conn.sql(f'CREATE TABLE "comtradetable" ({columns});')
+        conn.sql(
+            'INSERT INTO "comtradetable" BY NAME SELECT * FROM "comtradetable_legacy";'
+        )
+        conn.sql('DROP TABLE "comtradetable_legacy";')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def save_com_trade_data(db_path: str, path: str | Path) -> Path:
+    """
+    Writes ``comtradetable`` as Parquet files Hive partitioned by ``refYear``,
+    replacing the files already at ``path``. ``process_mirror_data`` reads them
+    through ``comtrade_path`` and only opens the years a query asks for.
+    """
+    path = Path(path)
+    conn = get_conn(db_path=db_path, read_only=True)
+    conn.sql(
+        f"""
+        COPY (SELECT * FROM comtradetable ORDER BY refYear, reporterCode)
+        TO {sql_literal(str(path))}
+        (FORMAT parquet, PARTITION_BY (refYear), OVERWRITE);
         """
     )
+    return path
+
+
+def process_int_trade_data(
+    db_path: str,
+    level: Literal["hts", "naics", "country", "total"],
+    time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+    datetime: str = "",
+    agriculture_filter: bool = False,
+    source: Literal["jp", "org"] = "org",
+    level_filter: str = "",
+    unit_factors: pl.DataFrame | None = None,
+) -> pl.DataFrame:
+    """
+    Runs JPTrade.process_int_jp as a single DuckDB query over the trade tables,
+    as ``JPTrade.process_int_jp(engine="duckdb")`` does.
+
+    ``unit_factors`` defaults to the package's unit conversion table, pass
+    ``JPTrade.unit_factors`` to use registered units.
+    """
+    conn = get_conn(db_path=db_path, read_only=True)
+    return process_int_sql(
+        conn=conn,
+        relation=SOURCE_TABLES[source],
+        level=level,
+        time_frame=time_frame,
+        datetime=datetime,
+        agriculture_filter=agriculture_filter,
+        level_filter=level_filter,
+        unit_factors=unit_factors,
+    )
+
+
+def process_mirror_data(
+    db_path: str,
+    level: Literal["hts", "country", "total"],
+    time_frame: Literal["yearly", "fiscal", "qtr", "monthly"],
+    datetime: str = "",
+    source: Literal["jp", "org"] = "org",
+    comtrade_path: str | Path | None = None,
+    countries: dict[int, str] | None = None,
+) -> pl.DataFrame:
+    """
+    Compares Puerto Rico's own trade with the mirror flows its partners report
+    to Comtrade, in the shapes of ``JPTrade.process_data``.
+
+    A partner's imports from Puerto Rico mirror Puerto Rico's exports to it and
+    its exports to Puerto Rico mirror the imports, so ``exports_gap`` is
+    ``partner_imports - exports`` and ``imports_gap`` is
+    ``imports - partner_exports``. Comtrade values are in US dollars, CIF for
+    the partner imports and FOB for its exports.
+
+    The ``hts`` level joins on HS6 codes and the other levels on the Comtrade
+    ``TOTAL`` rows. Only the monthly totals over every customs procedure and
+    transport mode are used, so every time frame can be derived. Partners are
+    matched to the ``country`` of the trade tables by their lower-cased
+    ``reporterDesc`` unless ``countries`` maps their M49 code to a name.
+
+    Args:
+        db_path (str): The path of the DuckDB database.
+        level (Literal["hts", "country", "total"]): The aggregation level.
+        time_frame (Literal["yearly", "fiscal", "qtr", "monthly"]): The time
+            frame.
+        datetime (str): Optional date filter, as in ``process_int_jp``.
+        source (Literal["jp", "org"]): The table of Puerto Rico's trade.
+            Defaults to ``"org"``.
+        comtrade_path (str | Path | None): Directory written by
+            ``save_com_trade_data`` to read the Comtrade data from. Defaults to
+            ``comtradetable``.
+        countries (dict[int, str] | None): Country names of partner M49 codes.
+            Defaults to the lower-cased ``reporterDesc``.
+
+    Returns:
+        pl.DataFrame: The grouping keys followed by ``imports``, ``exports``,
+            ``partner_imports``, ``partner_exports``, ``exports_gap`` and
+            ``imports_gap``.
+
+    Raises:
+        ValueError: If the level or time frame is invalid, or the date filter is
+            malformed.
+    """
+    if time_frame not in TIME_GROUPS or level not in ["hts", "country", "total"]:
+        raise ValueError(
+            f"Invalid combination layout requested: {time_frame=}, {level=}"
+        )
+
+    countries = countries or {}
+    group_by_keys = TIME_GROUPS[time_frame] + LEVEL_GROUPS[level]
+    keys = ", ".join(group_by_keys)
+    order = ", ".join(f"{col} NULLS FIRST" for col in group_by_keys)
+
+    # Key expressions of each side, the trade tables go down to HS6
+    own_columns = {**TIME_COLUMNS, "hts_code": "substr(hts_code, 1, 6)"}
+    partner_columns = {
+        **TIME_COLUMNS,
+        "hts_code": "cmdCode",
+        "country": "COALESCE(names.country, lower(reporterDesc))",
+    }
+
+    if comtrade_path is None:
+        comtrade = "comtradetable"
+    else:
+        pattern = sql_literal(f"{Path(comtrade_path)}/**/*.parquet")
+        comtrade = f"read_parquet({pattern}, hive_partitioning = true)"
+
+    own_conditions, own_params = date_conditions(datetime)
+    own_conditions += ["hts_code IS NOT NULL", "trade_id IN (1, 2)"]
+    partner_conditions, partner_params = date_conditions(
+        datetime, date="make_date(refYear, refMonth, 1)", year="refYear"
+    )
+    partner_conditions += [
+        "freqCode = 'M'",
+        "flowCode IN ('M', 'X')",
+        "partnerCode = ?",
+        "partner2Code = 0",
+        "customsCode = 'C00'",
+        "motCode = 0",
+        "aggrLevel = 6" if level == "hts" else "cmdCode = 'TOTAL'",
+    ]
+    partner_params.append(PR_CODE)
+
+    def key_columns(columns: dict[str, str]) -> str:
+        return ", ".join(f"{columns.get(col, col)} AS {col}" for col in group_by_keys)
+
+    query = f"""
+        WITH own AS (
+            SELECT
+                {keys},
+                COALESCE(SUM(data) FILTER (WHERE trade_id = 1), 0)::BIGINT
+                    AS imports,
+                COALESCE(SUM(data) FILTER (WHERE trade_id = 2), 0)::BIGINT
+                    AS exports
+            FROM (
+                SELECT {key_columns(own_columns)}, trade_id, data
+                FROM {SOURCE_TABLES[source]}
+                WHERE {" AND ".join(own_conditions)}
+            )
+            GROUP BY {keys}
+        ),
+        names AS (
+            SELECT
+                unnest(?::SMALLINT[]) AS reporterCode,
+                unnest(?::VARCHAR[]) AS country
+        ),
+        partner AS (
+            SELECT
+                {keys},
+                COALESCE(SUM(primaryValue) FILTER (WHERE flowCode = 'M'), 0)
+                    AS partner_imports,
+                COALESCE(SUM(primaryValue) FILTER (WHERE flowCode = 'X'), 0)
+                    AS partner_exports
+            FROM (
+                SELECT {key_columns(partner_columns)}, flowCode, primaryValue
+                FROM (
+                    SELECT *, make_date(refYear, refMonth, 1) AS date
+                    FROM {comtrade}
+                    WHERE {" AND ".join(partner_conditions)}
+                ) LEFT JOIN names USING (reporterCode)
+            )
+            GROUP BY {keys}
+        )
+        SELECT
+            {keys},
+            COALESCE(imports, 0) AS imports,
+            COALESCE(exports, 0) AS exports,
+            COALESCE(partner_imports, 0) AS partner_imports,
+            COALESCE(partner_exports, 0) AS partner_exports,
+            COALESCE(partner_imports, 0) - COALESCE(exports, 0) AS exports_gap,
+            COALESCE(imports, 0) - COALESCE(partner_exports, 0) AS imports_gap
+        FROM own FULL JOIN partner USING ({keys})
+        ORDER BY {order};
+    """
+
+    params = own_params + [list(countries), list(countries.values())]
+    conn = get_conn(db_path=db_path, read_only=True)
+    return conn.execute(query, params + partner_params).pl()
+
+
+def load_trade_data(
+    db_path: str,
+    table: Literal["inttradedata", "jptradedata", "comtradetable"],
+    data: LoadData,
+    batch_size: int = 1_000_000,
+) -> dict[str, float]:
+    """
+    Bulk loads monthly trade files or Arrow data into one of the trade tables.
+
+    Parquet and CSV files (paths or glob patterns) are read by DuckDB directly,
+    Arrow and Polars data is streamed in record batches of ``batch_size`` rows,
+    so memory stays bounded by a single file or batch. Each partition in
+    ``LOAD_PARTITIONS`` found in the input replaces the rows already stored for
+    it, which makes reloading a month idempotent.
+    """
+    partition = LOAD_PARTITIONS[table]
+    loaded = set()
+    rows = 0
+    start = time.perf_counter()
+
+    conn = get_conn(db_path=db_path)
+    table_columns = set(conn.table(table).columns)
+
+    for chunk in _load_chunks(conn=conn, data=data, batch_size=batch_size):
+        columns = [col for col in conn.table(chunk).columns if col in table_columns]
+        partitions = {
+            row[0]
+            for row in conn.execute(
+                f"SELECT DISTINCT {partition} FROM {chunk};"
+            ).fetchall()
+        }
+
+        conn.begin()
+        try:
+            # Only clear a partition the first time it shows up, later
+            # chunks of the same partition are appended to it
+            if partitions - loaded:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE list_contains(?, {partition});",
+                    [sorted(partitions - loaded)],
+                )
+            rows += conn.execute(
+                f"INSERT INTO {table} BY NAME SELECT {', '.join(columns)} FROM {chunk};"
+            ).fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(f"DROP VIEW IF EXISTS {chunk};")
+        loaded |= partitions
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else 0.0,
+    }
+    logging.info(
+        f"Loaded {rows} rows into {table} in {seconds:.2f}s "
+        f"({stats['rows_per_sec']:.0f} rows/sec)"
+    )
+    return stats
+
+
+def _load_chunks(
+    conn: duckdb.DuckDBPyConnection,
+    data: LoadData,
+    batch_size: int,
+) -> Iterator[str]:
+    """Yields the name of a temporary view over each chunk of the input data."""
+    if isinstance(data, (str, Path, list)):
+        patterns = data if isinstance(data, list) else [data]
+        files = sorted(
+            file
+            for pattern in patterns
+            for file in glob.glob(str(pattern), recursive=True)
+        )
+        readers = {".parquet": conn.read_parquet, ".csv": conn.read_csv}
+        for file in files:
+            reader = readers.get(Path(file).suffix.lower())
+            if reader is None:
+                raise ValueError(f"Unsupported file type: {file}")
+            chunk = f"load_{uuid.uuid4().hex}"
+            reader(file).create_view(chunk)
+            yield chunk
+        return
+
+    batches: Iterable[pa.RecordBatch]
+    if isinstance(data, pl.DataFrame):
+        batches = data.to_arrow().to_batches(max_chunksize=batch_size)
+    elif isinstance(data, pa.Table):
+        batches = data.to_batches(max_chunksize=batch_size)
+    else:
+        batches = data
+
+    for batch in batches:
+        chunk = f"load_{uuid.uuid4().hex}"
+        conn.from_arrow(pa.Table.from_batches([batch])).create_view(chunk)
+        yield chunk
@@ -0,0 +1,105 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+import pytest
+from synthetic import describe, trade_frame
+
+from jp_imports.jp_imports import JPTrade
+
+YEARS = [2007, 2008, 2012]
+
+# Agricultural and industrial headings, including the codes of the packaged
+# correction rules
+HTS_CODES = [
+    "0201100000", "0201300010", "1004900000", "2207100000", "2208700000",
+    "2304000000", "2714900000", "8471300100", "8471500150", None,
+]  # fmt: skip
+
+COUNTRIES = ["united states", "china", "mexico", "spain", None]
+
+UNITS = ["kg", "KG", "t", "l", "pfl", "doz", "no", None]
+
+NAICS = {"02": "311", "10": "111", "22": "312", "23": "311", "27": "324", "84": "334"}
+
+
+def raw_month(
+    year: int,
+    month: int,
+    source: Literal["org", "jp"] = "org",
+    rows: int = 60,
+) -> pl.DataFrame:
+    """
+    Generates one month of raw trade records shaped like ``inttradedata`` or
+    ``jptradedata`` with the benchmarks' ``trade_frame``, over a few codes
+    including null ones, plus the records the correction rules fix.
+    """
+    df = trade_frame(
+        rows,
+        year,
+        month,
+        source,
+        codes=HTS_CODES,
+        seed=["org", "jp"].index(source),
+        countries=COUNTRIES,
+        units=UNITS,
+        naics=NAICS,
+    )
+
+    base = {"date": datetime(year, month, 1), "trade_id": 1, "data": 1_000}
+    records = []
+    if (year, month) == (2007, 3):
+        records.append(
+            base
+            | {"country": "china", "hts_code": "2304000000"}
+            | {"unit_1": "kg", "qty_1": 7540542599, "unit_2": None, "qty_2": None}
+        )
+    if (year, month) == (2008, 6):
+        records.append(
+            base
+            | {"country": "spain", "hts_code": "2714900000"}
+            | {"unit_1": "kg", "qty_1": 5000000, "unit_2": None, "qty_2": None}
+        )
+    if year == 2012:
+        for country in ["united states", "mexico"]:
+            records.append(
+                base
+                | {"country": country, "hts_code": "1004900000"}
+                | {"unit_1": "t", "qty_1": 12, "unit_2": None, "qty_2": None}
+            )
+    if not records:
+        return df
+
+    fixed = pl.DataFrame(records, schema={col: df.schema[col] for col in records[0]})
+    return pl.concat(
+        [df, describe(fixed, source=source, naics=NAICS).select(df.columns)]
+    )
+
+
+def write_raw(saving_dir: Path) -> Path:
+    """Writes the raw partitions of both sources in the layout of ``scan_int``."""
+    for source in ["org", "jp"]:
+        for year in YEARS:
+            for month in range(1, 13):
+                path = saving_dir / "raw" / source / str(year) / f"{month:02d}"
+                path.mkdir(parents=True, exist_ok=True)
+                raw_month(year, month, source).write_parquet(path / "data.parquet")
+    return saving_dir
+
+
+class OfflineTrade(JPTrade):
+    """Reads the raw partitions written by ``write_raw`` instead of pulling them."""
+
+    def _pull(self, source: Literal["jp", "org"] = "org") -> pl.DataFrame:
+        return pl.read_parquet(self.saving_dir / "raw" / source / "*/*/*.parquet")
+
+
+@pytest.fixture(scope="session")
+def saving_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    return write_raw(tmp_path_factory.mktemp("data"))
+
+
+@pytest.fixture
+def trade(saving_dir: Path) -> OfflineTrade:
+    return OfflineTrade(saving_dir=str(saving_dir), log_file=str(saving_dir / "log"))
@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+import polars as pl
+import pytest
+from conftest import OfflineTrade
+
+from jp_imports import cli
+
+
+@pytest.fixture
+def run(saving_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cli, "JPTrade", OfflineTrade)
+
+    def run(output: Path, *args: str) -> None:
+        cli.main(
+            [str(output), *args]
+            + ["--saving-dir", str(saving_dir), "--log-file", str(saving_dir / "log")]
+        )
+
+    return run
+
+
+def test_main_writes_outputs_and_manifest(
+    run, trade: OfflineTrade, tmp_path: Path
+) -> None:
+    run(tmp_path, "--levels", "hts", "country", "--time-frames", "yearly", "monthly")
+
+    manifest = json.loads((tmp_path / cli.MANIFEST).read_text())
+    assert len(manifest) == 4
+    for name, entry in manifest.items():
+        files = sorted(
+            str(path.relative_to(tmp_path / name))
+            for path in (tmp_path / name).glob("*/*")
+        )
+        assert files == entry["files"]
+        assert all(file.startswith("year=") for file in files)
+        expected = trade.process_int_jp(
+            level=entry["level"], time_frame=entry["time_frame"]
+        )
+        written = pl.read_parquet(tmp_path / name / "**/*.parquet")
+        assert written.height == entry["rows"] == expected.height
+        assert entry["fingerprint"] == trade.fingerprint()
+
+
+def test_main_resume_skips_up_to_date_outputs(
+    run, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    run(tmp_path, "--time-frames", "yearly")
+    before = json.loads((tmp_path / cli.MANIFEST).read_text())
+    capsys.readouterr()
+
+    run(tmp_path, "--time-frames", "yearly", "qtr", "--resume")
+
+    assert "Skipping 1 of 2 outputs" in capsys.readouterr().out
+    after = json.loads((tmp_path / cli.MANIFEST).read_text())
+    assert len(after) == 2
+    for name, entry in before.items():
+        assert after[name] == entry
+
+    # A change of format rewrites the outputs
+    run(tmp_path, "--time-frames", "yearly", "--format", "csv", "--resume")
+    assert "Skipping 0 of 1 outputs" in capsys.readouterr().out
+
+
+def test_main_exits_on_failing_filter(run, tmp_path: Path) -> None:
+    with pytest.raises(SystemExit) as info:
+        run(tmp_path, "--levels", "hts", "--filters", "99", "02")
+
+    assert info.value.code == 1
+    manifest = json.loads((tmp_path / cli.MANIFEST).read_text())
+    assert [entry["level_filter"] for entry in manifest.values()] == ["02"]
+
+
+def test_filters_are_scoped_to_their_level() -> None:
+    args = cli.parse_args(
+        ["out", "--levels", "hts", "country", "total", "--filters", "hts:22", ""]
+    )
+    queries = cli.matrix(args)
+
+    assert sorted((q["level"], q["level_filter"]) for q in queries.values()) == [
+        ("country", ""),
+        ("hts", ""),
+        ("hts", "22"),
+        ("total", ""),
+    ]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [["22"], ["naics:22"]],
+)
+def test_ambiguous_filters_are_rejected(filters: list[str]) -> None:
+    with pytest.raises(SystemExit) as info:
+        cli.parse_args(["out", "--levels", "hts", "country", "--filters", *filters])
+
+    assert info.value.code == 2
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime
+
+import duckdb
+import polars as pl
+import pytest
+
+from jp_imports.jp_imports import load_corrections
+from jp_imports.sql import corrections_relation
+
+RULE = {
+    "start": "2012-01",
+    "end": "2012-02",
+    "hts_code": "1004900000",
+    "column": "unit_1",
+    "value": "t",
+}
+
+
+def write_rules(tmp_path, *rules: dict) -> str:
+    path = tmp_path / "corrections.json"
+    path.write_text(
+        json.dumps({"version": 2, "rules": [RULE | rule for rule in rules]})
+    )
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        [
+            {"country": "united states", "new_value": "kg"},
+            {"exclude_country": "united states", "new_value": "l"},
+        ],
+        [
+            {"country": "united states", "new_value": "kg"},
+            {"country": "mexico", "new_value": "l"},
+        ],
+    ],
+)
+def test_disjoint_country_rules(trade, tmp_path, rules):
+    version, trade.correction_rules = load_corrections(write_rules(tmp_path, *rules))
+    assert version == 2
+
+    # Only the records of the rule months with a country in scope are fixed
+    df = pl.DataFrame(
+        {
+            "date": [datetime(2012, 1, 1)] * 3 + [datetime(2012, 3, 1)],
+            "country": ["united states", "mexico", None, "united states"],
+            "hts_code": ["1004900000"] * 4,
+            "unit_1": ["t"] * 4,
+            "qty_1": [1, 2, 3, 4],
+        }
+    )
+    for frame in [df, df.lazy()]:
+        corrected = trade.corrections(frame).lazy().collect()
+        assert corrected.columns == df.columns
+        assert corrected["unit_1"].to_list() == ["kg", "l", "t", "t"]
+        assert corrected["qty_1"].to_list() == [1, 2, 3, 4]
+
+    conn = duckdb.connect()
+    conn.register("records", df)
+    relation, params = corrections_relation(conn, "records", trade.correction_rules)
+    corrected = conn.execute(f"SELECT * FROM {relation} ORDER BY qty_1", params).pl()
+    assert corrected["unit_1"].to_list() == ["kg", "l", "t", "t"]
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        [{"new_value": "kg"}, {"new_value": "l"}],
+        [{"country": "united states", "new_value": "kg"}, {"new_value": "l"}],
+        [
+            {"country": "united states", "new_value": "kg"},
+            {"exclude_country": "mexico", "new_value": "l"},
+        ],
+        [
+            {"exclude_country": "united states", "new_value": "kg"},
+            {"exclude_country": "mexico", "new_value": "l"},
+        ],
+    ],
+)
+def test_overlapping_rules(tmp_path, rules):
+    with pytest.raises(ValueError):
+        load_corrections(write_rules(tmp_path, *rules))
@@ -0,0 +1,87 @@
+import polars as pl
+import pytest
+from conftest import raw_month
+from polars.testing import assert_frame_equal
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+pytest.importorskip("sqlmodel")
+
+from dao.jp_imports_raw import (
+    DIMENSIONS,
+    HTSTable,
+    IntTradeData,
+    JPTradeData,
+    TradeTable,
+    load_trade_data,
+)
+
+
+@pytest.fixture(params=["sqlite://", "duckdb:///:memory:"])
+def engine(request):
+    if request.param.startswith("duckdb"):
+        pytest.importorskip("duckdb_engine")
+    engine = sqlalchemy.create_engine(request.param)
+    yield engine
+    engine.dispose()
+
+
+def read(engine, model) -> pl.DataFrame:
+    # Dates are left out, DuckDB needs pytz to fetch the aware timestamps
+    columns = [col for col in model.__table__.c if col.name != "date"]
+    with engine.connect() as conn:
+        result = conn.execute(sqlalchemy.select(*columns))
+        return pl.DataFrame(result.all(), schema=list(result.keys()), orient="row")
+
+
+def dimension_ids(engine) -> dict[str, dict[str, int]]:
+    return {
+        dimension.__name__: dict(
+            read(engine, dimension).select(code_field, "id").iter_rows()
+        )
+        for dimension, code_field, _, _ in DIMENSIONS
+    }
+
+
+@pytest.mark.parametrize("source, model", [("org", IntTradeData), ("jp", JPTradeData)])
+def test_load_trade_data_reload(engine, source, model):
+    first = pl.concat(raw_month(2008, month, source) for month in [1, 2, 3])
+    stats = load_trade_data(engine, first, model=model, batch_size=50)
+    assert stats["rows"] == first.height
+    ids = dimension_ids(engine)
+
+    # March is reloaded with other records next to a new April
+    march = raw_month(2008, 3, source, rows=10).with_columns(data=pl.lit(7, pl.Int64))
+    second = pl.concat([march, raw_month(2008, 4, source)])
+    stats = load_trade_data(engine, second, model=model, batch_size=50)
+    assert stats["rows"] == second.height
+
+    expected = pl.concat([first.filter(pl.col("date").dt.month() < 3), second])
+    facts = read(engine, model)
+    assert facts.height == expected.height
+    assert facts["data"].sum() == expected["data"].sum()
+    assert facts["id"].is_unique().all()
+
+    # Codes keep their id across loads and resolve back to the raw records
+    for name, codes in dimension_ids(engine).items():
+        assert codes.items() >= ids[name].items()
+    for dimension, code_field, keys, _ in DIMENSIONS:
+        table = read(engine, dimension)
+        assert table[code_field].is_unique().all()
+        for col, fk in keys.items():
+            if col not in expected.columns or fk not in facts.columns:
+                continue
+            codes = table.select(pl.col("id").alias(fk), pl.col(code_field).alias(col))
+            resolved = facts.join(codes, on=fk, how="left")
+            assert_frame_equal(
+                resolved.group_by(col).agg(pl.sum("data")).sort(col),
+                expected.group_by(col).agg(pl.sum("data")).sort(col),
+            )
+
+    # The seed rows are merged once, the loaded HTS codes come after them
+    assert read(engine, TradeTable).sort("id").rows() == [
+        (1, "Imports"),
+        (2, "Exports"),
+    ]
+    hts = read(engine, HTSTable).sort("id")
+    assert hts.row(0, named=True)["hts_code"] == "N/A"
+    assert hts["id"].to_list() == list(range(1, hts.height + 1))
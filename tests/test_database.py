@@ -0,0 +1,88 @@
+import threading
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from jp_imports.database import ConnectionPool
+
+
+@pytest.fixture
+def pool():
+    with ConnectionPool() as pool:
+        yield pool
+
+
+def in_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_cursors_are_per_thread(pool: ConnectionPool, tmp_path: Path) -> None:
+    db_path = tmp_path / "data.duckdb"
+    cursor = pool.cursor(db_path)
+    cursor.execute("CREATE TABLE t AS SELECT 42 AS x;")
+
+    assert pool.cursor(db_path) is cursor
+    other = in_thread(lambda: pool.cursor(db_path))
+    assert other is not cursor
+    # Every cursor sees the same database instance
+    assert in_thread(
+        lambda: pool.cursor(db_path).execute("SELECT x FROM t;").fetchone()
+    ) == (42,)
+
+
+def test_cursors_of_exited_threads_are_closed(
+    pool: ConnectionPool, tmp_path: Path
+) -> None:
+    db_path = tmp_path / "data.duckdb"
+    others = [in_thread(lambda: pool.cursor(db_path)) for _ in range(3)]
+    cursor = pool.cursor(db_path)
+
+    assert list(pool._cursors[str(db_path)].values()) == [cursor]
+    for other in others:
+        with pytest.raises(duckdb.ConnectionException):
+            other.execute("SELECT 1;")
+
+
+def test_read_only_is_upgraded(pool: ConnectionPool, tmp_path: Path) -> None:
+    db_path = tmp_path / "data.duckdb"
+    duckdb.connect(str(db_path)).execute("CREATE TABLE t AS SELECT 1 AS x;").close()
+
+    reader = pool.cursor(db_path, read_only=True)
+    with pytest.raises(duckdb.InvalidInputException):
+        reader.execute("INSERT INTO t VALUES (2);")
+
+    writer = pool.cursor(db_path)
+    writer.execute("INSERT INTO t VALUES (2);")
+    # A read-write database serves read-only requests
+    assert pool.cursor(db_path, read_only=True) is writer
+    assert writer.execute("SELECT count(*) FROM t;").fetchone() == (2,)
+    with pytest.raises(duckdb.ConnectionException):
+        reader.execute("SELECT 1;")
+
+
+def test_memory_database_ignores_read_only(pool: ConnectionPool) -> None:
+    cursor = pool.cursor(read_only=True)
+    cursor.execute("CREATE TABLE t AS SELECT 1 AS x;")
+
+    assert pool.cursor() is cursor
+    assert cursor.execute("SELECT x FROM t;").fetchone() == (1,)
+
+
+def test_close(pool: ConnectionPool, tmp_path: Path) -> None:
+    first, second = tmp_path / "first.duckdb", tmp_path / "second.duckdb"
+    cursor = pool.cursor(first)
+    pool.cursor(second)
+
+    pool.close(first)
+    assert list(pool._databases) == [str(second)]
+    with pytest.raises(duckdb.ConnectionException):
+        cursor.execute("SELECT 1;")
+    assert pool.cursor(first) is not cursor
+
+    pool.close()
+    assert pool._databases == pool._cursors == {}
@@ -0,0 +1,198 @@
+import itertools
+from datetime import datetime
+
+import duckdb
+import polars as pl
+import pytest
+from conftest import raw_month
+from polars.testing import assert_frame_equal
+
+from jp_imports.jp_imports import LEVEL_GROUPS, TIME_GROUPS, JPTrade
+from jp_imports.sql import qty_column
+
+# Every level and time frame, on the sources having the level's columns
+SHAPES = [
+    (source, time_frame, level)
+    for source, time_frame, level in itertools.product(
+        ["org", "jp"], TIME_GROUPS, LEVEL_GROUPS
+    )
+    if not (source == "org" and level == "naics")
+]
+
+
+@pytest.mark.parametrize("source, time_frame, level", SHAPES)
+def test_cube_matches_base(trade, source, time_frame, level):
+    expected = trade.process_int_jp(level=level, time_frame=time_frame, source=source)
+    result = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, cube=True
+    )
+    assert_frame_equal(result, expected, check_exact=False)
+
+
+# Filters of every level, including the correction rules and the agricultural
+# code list
+FILTERS = {
+    "total": {},
+    "hts": {"level_filter": "0"},
+    "naics": {"level_filter": "31"},
+    "country": {"level_filter": "ch"},
+}
+
+
+# Optional arguments, combined with the filter of the level when not empty
+QUERIES = [
+    {},
+    {"agriculture_filter": True, "corrections": True, "datetime": "2008"},
+    {"corrections": True, "datetime": "2007-02-01+2012-05-01"},
+]
+
+
+@pytest.mark.parametrize("source, time_frame, level", SHAPES)
+@pytest.mark.parametrize("kwargs", QUERIES)
+@pytest.mark.parametrize("mode", ["lazy", "cache"])
+def test_mode_matches_eager(trade, source, time_frame, level, kwargs, mode):
+    kwargs = kwargs | FILTERS[level] if kwargs else kwargs
+    expected = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, **kwargs
+    )
+    result = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, **kwargs, **{mode: True}
+    )
+    assert_frame_equal(result, expected, check_exact=False)
+
+
+@pytest.mark.parametrize("mode", [None, "lazy", "cache", "cube", "snapshot"])
+def test_process_many_matches_eager(trade, mode):
+    specs = {
+        (source, time_frame, level, index): {
+            "source": source,
+            "time_frame": time_frame,
+            "level": level,
+        }
+        | (kwargs | FILTERS[level] if kwargs else kwargs)
+        for source, time_frame, level in SHAPES
+        for index, kwargs in enumerate(QUERIES)
+    }
+    results = trade.process_many(specs, **({mode: True} if mode else {}))
+
+    assert results.keys() == specs.keys()
+    for name, spec in specs.items():
+        assert_frame_equal(
+            results[name], trade.process_int_jp(**spec), check_exact=False
+        )
+
+
+@pytest.mark.parametrize("key", ["lazy", "cache", "cube", "snapshot", "engine"])
+def test_process_many_rejects_batch_keys(trade, key):
+    spec = {"level": "hts", "time_frame": "yearly", key: True}
+    with pytest.raises(ValueError, match=key):
+        trade.process_many({"query": spec})
+
+
+@pytest.mark.parametrize("source, time_frame, level", SHAPES)
+@pytest.mark.parametrize("kwargs", QUERIES)
+def test_duckdb_engine_matches_polars(trade, source, time_frame, level, kwargs):
+    kwargs = kwargs | FILTERS[level] if kwargs else kwargs
+    expected = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, **kwargs
+    )
+    result = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, engine="duckdb", **kwargs
+    )
+    assert_frame_equal(result, expected, check_exact=False)
+
+
+def test_duckdb_engine_rejects_precomputed_tables(trade):
+    with pytest.raises(ValueError):
+        trade.process_int_jp(
+            level="hts", time_frame="yearly", cube=True, engine="duckdb"
+        )
+
+
+def test_register_unit_matches_sql(trade):
+    trade.register_unit("bbl", 136.4)
+    trade.register_unit("BBL", 150, hts6="271490")
+    # An HTS6 rule for a known unit, and a new factor keeping the unit's priority
+    trade.register_unit("kg", 2, hts6="020110")
+    trade.register_unit("t", 900)
+
+    df = pl.DataFrame(
+        [
+            ("2714900000", "bbl", 2, None, None, 300.0),
+            ("2207100000", "BBL", 2, None, None, 272.8),
+            ("0201100000", "kg", 3, None, None, 6.0),
+            ("0201300010", "KG", 3, None, None, 3.0),
+            # The unit first in the table wins, a new unit comes last
+            ("2714900000", "bbl", 1, "kg", 5, 5.0),
+            ("2304000000", "bbl", 1, "t", 2, 1800.0),
+            ("2714900000", "no", 4, "bbl", 2, 300.0),
+            ("2714900000", "no", 4, None, None, None),
+        ],
+        schema={
+            "hts_code": pl.String,
+            "unit_1": pl.String,
+            "qty_1": pl.Int64,
+            "unit_2": pl.String,
+            "qty_2": pl.Int64,
+            "expected": pl.Float64,
+        },
+        orient="row",
+    ).with_columns(date=pl.lit(datetime(2024, 1, 1)))
+
+    result = trade.conversion(df)
+    assert_frame_equal(
+        result.select("qty"), df.select(qty="expected"), check_exact=False
+    )
+    sql = duckdb.sql(f"SELECT {qty_column(trade.unit_factors)} AS qty FROM df").pl()
+    assert_frame_equal(sql, result.select("qty"), check_exact=False)
+
+
+@pytest.mark.parametrize("source, time_frame, level", SHAPES)
+@pytest.mark.parametrize("corrections", [False, True])
+def test_snapshot_matches_base(trade, source, time_frame, level, corrections):
+    kwargs = FILTERS[level] | {"corrections": corrections, "datetime": "2008"}
+    expected = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, **kwargs
+    )
+    result = trade.process_int_jp(
+        level=level, time_frame=time_frame, source=source, snapshot=True, **kwargs
+    )
+    assert_frame_equal(result, expected, check_exact=False)
+
+
+def test_snapshot_maps_categorical_codes(trade):
+    trade.snapshot(source="jp")
+    _, mapped, categories = trade._snapshots["jp-uncorrected"]
+    assert sorted(categories) == ["country", "hts_code", "naics", "unit_1", "unit_2"]
+    assert pl.Categorical not in mapped.schema.dtypes()
+
+    snapshot = trade.snapshot(source="jp").collect()
+    base = trade.base_table(source="jp").collect()
+    assert snapshot.schema == base.schema
+    assert_frame_equal(snapshot, base)
+
+
+class FlatTrade(JPTrade):
+    """Pulls into a single file, as pr-imports did before partitioning it."""
+
+    def _pull(self, source="org") -> pl.DataFrame:
+        df = raw_month(2008, 1, source)
+        df.write_parquet(self.saving_dir / "raw" / "jp_data.parquet")
+        return df
+
+
+def test_raw_dir_without_partitions(tmp_path):
+    (tmp_path / "raw").mkdir()
+    trade = FlatTrade(saving_dir=str(tmp_path), log_file=str(tmp_path / "log"))
+    with pytest.raises(FileNotFoundError, match="pr-imports"):
+        trade.process_int_jp(level="hts", time_frame="yearly", lazy=True)
+
+
+def test_descriptions_default_to_org(trade):
+    descriptions = trade.descriptions()
+    assert_frame_equal(descriptions, trade.descriptions(source="org"))
+    assert descriptions["hts_code"].is_unique().all()
+
+    df = trade.describe(trade.process_int_jp(level="hts", time_frame="yearly"))
+    coded = df.filter(pl.col("hts_code").is_not_null())
+    assert coded["hts_desc"].null_count() == 0
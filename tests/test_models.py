@@ -0,0 +1,260 @@
+import polars as pl
+import pytest
+from conftest import YEARS, raw_month
+from polars.testing import assert_frame_equal
+
+import models
+from jp_imports.jp_imports import LEVEL_GROUPS, TIME_GROUPS
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    db_path = str(tmp_path / "trade.duckdb")
+    models.init_int_trade_data_table(db_path)
+    models.init_jp_trade_data_table(db_path)
+    return db_path
+
+
+def stored(db_path: str, table: str) -> pl.DataFrame:
+    return models.get_conn(db_path=db_path).sql(f"SELECT * FROM {table}").pl()
+
+
+@pytest.mark.parametrize("source", ["org", "jp"])
+def test_load_trade_data_reload_replaces_month(db_path, source):
+    table = models.SOURCE_TABLES[source]
+    first = pl.concat(raw_month(2008, month, source) for month in [1, 2, 3])
+    stats = models.load_trade_data(db_path, table, first, batch_size=50)
+    assert stats["rows"] == first.height
+
+    # March is reloaded with other records next to a new April
+    march = raw_month(2008, 3, source, rows=10).with_columns(data=pl.lit(7, pl.Int64))
+    second = pl.concat([march, raw_month(2008, 4, source)])
+    stats = models.load_trade_data(db_path, table, second.to_arrow())
+    assert stats["rows"] == second.height
+
+    result = stored(db_path, table)
+    expected = pl.concat([first.filter(pl.col("date").dt.month() < 3), second])
+    assert_frame_equal(
+        result.sort(pl.all()),
+        expected.select(result.columns).sort(pl.all()),
+        check_dtypes=False,
+    )
+
+
+@pytest.mark.parametrize("source", ["org", "jp"])
+@pytest.mark.parametrize("level", LEVEL_GROUPS)
+def test_load_trade_data_round_trip(trade, saving_dir, db_path, source, level):
+    if source == "org" and level == "naics":
+        pytest.skip("The org source has no NAICS codes")
+    table = models.SOURCE_TABLES[source]
+    models.load_trade_data(
+        db_path, table, str(saving_dir / "raw" / source / "**/*.parquet")
+    )
+    assert stored(db_path, table).height == sum(
+        raw_month(year, month, source).height
+        for year in YEARS
+        for month in range(1, 13)
+    )
+
+    for time_frame in TIME_GROUPS:
+        result = models.process_int_trade_data(
+            db_path, level=level, time_frame=time_frame, source=source
+        )
+        expected = trade.process_int_jp(
+            level=level, time_frame=time_frame, source=source
+        )
+        assert_frame_equal(result, expected, check_exact=False)
+
+
+def insert(db_path: str, table: str, df: pl.DataFrame) -> None:
+    conn = models.get_conn(db_path=db_path)
+    conn.register("rows", df)
+    conn.sql(f'INSERT INTO "{table}" BY NAME SELECT * FROM rows;')
+    conn.unregister("rows")
+
+
+def comtrade(**values) -> dict:
+    """A monthly Comtrade total of a partner's trade with Puerto Rico."""
+    return {
+        "freqCode": "M",
+        "refYear": 2024,
+        "refMonth": 1,
+        "partnerCode": models.PR_CODE,
+        "partner2Code": 0,
+        "customsCode": "C00",
+        "motCode": 0,
+        "cmdCode": "TOTAL",
+        "aggrLevel": 0,
+    } | values
+
+
+def test_init_com_trade_data_table_migrates_legacy_table(tmp_path):
+    db_path = str(tmp_path / "trade.duckdb")
+    # The older layout only typed the quantities and values
+    floats = {"qty", "altQty", "netWgt", "grossWgt", "cifvalue", "fobvalue"}
+    floats.add("primaryValue")
+    columns = ", ".join(
+        f"{col} {'FLOAT' if col in floats else 'VARCHAR(255)'}"
+        for col in models.COMTRADE_COLUMNS
+    )
+    conn = models.get_conn(db_path=db_path)
+    conn.sql(f'CREATE TABLE "comtradetable" ({columns});')
+    conn.sql(
+        """
+        INSERT INTO "comtradetable"
+            (freqCode, refYear, refMonth, reporterCode, flowCode, cmdCode,
+            isLeaf, primaryValue)
+        VALUES
+            ('M', '2024', '1', '724', 'X', 'TOTAL', 'False', 110.5),
+            ('A', '2023', NULL, '276', 'RM', '020110', 'True', 70);
+        """
+    )
+
+    models.init_com_trade_data_table(db_path)
+    models.init_com_trade_data_table(db_path)
+
+    types = dict(
+        conn.execute(
+            """
+            SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_name = 'comtradetable';
+            """
+        ).fetchall()
+    )
+    assert list(types) == list(models.COMTRADE_COLUMNS)
+    assert types["refYear"] == "SMALLINT"
+    assert types["isLeaf"] == "BOOLEAN"
+    assert types["primaryValue"] == "DOUBLE"
+    assert types["flowCode"].startswith("ENUM")
+    rows = conn.sql(
+        """
+        SELECT freqCode::VARCHAR, refYear, refMonth, reporterCode,
+            flowCode::VARCHAR, cmdCode, isLeaf, primaryValue
+        FROM comtradetable ORDER BY refYear DESC;
+        """
+    ).fetchall()
+    assert rows == [
+        ("M", 2024, 1, 724, "X", "TOTAL", False, 110.5),
+        ("A", 2023, None, 276, "RM", "020110", True, 70.0),
+    ]
+    assert conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name LIKE '%legacy';"
+    ).fetchone() == (0,)
+
+
+@pytest.fixture
+def mirror_db(db_path) -> str:
+    insert(
+        db_path,
+        "inttradedata",
+        pl.DataFrame(
+            [
+                ("spain", 2024, 1, 1, "0201100000", 100),
+                ("spain", 2024, 1, 1, "0201100099", 20),
+                ("spain", 2024, 2, 2, "2208700000", 300),
+                ("china", 2024, 1, 2, "8471300100", 40),
+                # Outside the date filter, without a code, or not a flow
+                ("spain", 2023, 12, 1, "0201100000", 1_000),
+                ("spain", 2024, 1, 1, None, 1_000),
+                ("spain", 2024, 1, 3, "0201100000", 1_000),
+            ],
+            schema=["country", "year", "month", "trade_id", "hts_code", "data"],
+            orient="row",
+        ).select(
+            pl.date(pl.col("year"), pl.col("month"), 1).alias("date"),
+            "country",
+            "trade_id",
+            "hts_code",
+            "data",
+        ),
+    )
+    models.init_com_trade_data_table(db_path)
+    spain = {"reporterCode": 724, "reporterDesc": "Spain"}
+    germany = {"reporterCode": 276, "reporterDesc": "Fed. Rep. of Germany"}
+    insert(
+        db_path,
+        "comtradetable",
+        pl.DataFrame(
+            [
+                comtrade(**spain, flowCode="X", primaryValue=110.0),
+                comtrade(**spain, flowCode="X", primaryValue=110.0)
+                | {"cmdCode": "020110", "aggrLevel": 6},
+                comtrade(**spain, flowCode="M", refMonth=2, primaryValue=280.0),
+                comtrade(**spain, flowCode="M", refMonth=2, primaryValue=280.0)
+                | {"cmdCode": "220870", "aggrLevel": 6},
+                comtrade(**germany, flowCode="M", refMonth=3, primaryValue=70.0),
+                # Trade with the world, by customs procedure, re-imports, annual
+                # totals, or out of the date filter
+                comtrade(**spain, flowCode="M", primaryValue=1e6, partnerCode=0),
+                comtrade(**spain, flowCode="M", primaryValue=1e6, customsCode="C01"),
+                comtrade(**spain, flowCode="RM", primaryValue=1e6),
+                comtrade(**spain, flowCode="M", primaryValue=1e6, freqCode="A"),
+                comtrade(**spain, flowCode="M", primaryValue=1e6, refYear=2023),
+            ]
+        ),
+    )
+    return db_path
+
+
+MIRROR_COLUMNS = [
+    "imports",
+    "exports",
+    "partner_imports",
+    "partner_exports",
+    "exports_gap",
+    "imports_gap",
+]
+
+
+@pytest.mark.parametrize(
+    ("level", "expected"),
+    [
+        ("total", [(2024, 120, 340, 350, 110, 10, 10)]),
+        (
+            "country",
+            [
+                (2024, "china", 0, 40, 0, 0, -40, 0),
+                (2024, "germany", 0, 0, 70, 0, 70, 0),
+                (2024, "spain", 120, 300, 280, 110, -20, 10),
+            ],
+        ),
+        (
+            "hts",
+            [
+                (2024, "020110", 120, 0, 0, 110, 0, 10),
+                (2024, "220870", 0, 300, 280, 0, -20, 0),
+                (2024, "847130", 0, 40, 0, 0, -40, 0),
+            ],
+        ),
+    ],
+)
+def test_process_mirror_data_totals(mirror_db, tmp_path, level, expected):
+    countries = {276: "germany"}
+    result = models.process_mirror_data(
+        mirror_db,
+        level=level,
+        time_frame="yearly",
+        datetime="2024",
+        countries=countries,
+    )
+    assert_frame_equal(
+        result,
+        pl.DataFrame(
+            expected,
+            schema=["year", *LEVEL_GROUPS[level], *MIRROR_COLUMNS],
+            orient="row",
+        ),
+        check_dtypes=False,
+    )
+
+    # The same totals from the Parquet export
+    path = models.save_com_trade_data(mirror_db, tmp_path / "comtrade")
+    exported = models.process_mirror_data(
+        mirror_db,
+        level=level,
+        time_frame="yearly",
+        datetime="2024",
+        countries=countries,
+        comtrade_path=path,
+    )
+    assert_frame_equal(exported, result)
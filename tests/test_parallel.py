@@ -0,0 +1,41 @@
+import pytest
+from polars.testing import assert_frame_equal
+
+# Every level and time frame once, each pool start costs a couple of seconds
+SHAPES = [
+    ("yearly", "hts", {"level_filter": "0"}),
+    ("fiscal", "naics", {"level_filter": "31"}),
+    ("qtr", "country", {"level_filter": "ch"}),
+    ("monthly", "total", {}),
+]
+
+
+@pytest.mark.parametrize("time_frame, level, level_filter", SHAPES)
+@pytest.mark.parametrize("partition", ["year", "fiscal"])
+def test_parallel_matches_eager(trade, time_frame, level, level_filter, partition):
+    kwargs = {
+        "level": level,
+        "time_frame": time_frame,
+        "source": "jp",
+        "corrections": True,
+        # Starts and ends within fiscal years, so both partitions cut groups
+        "datetime": "2007-02-01+2012-05-01",
+        **level_filter,
+    }
+    result = trade.process_parallel(
+        **kwargs, partition=partition, workers=2, max_memory=64 * 2**30
+    )
+    assert_frame_equal(result, trade.process_int_jp(**kwargs), check_exact=False)
+
+
+def test_parallel_agriculture_unfiltered(trade):
+    kwargs = {"level": "hts", "time_frame": "fiscal", "agriculture_filter": True}
+    result = trade.process_parallel(**kwargs, workers=2)
+    assert_frame_equal(result, trade.process_int_jp(**kwargs), check_exact=False)
+
+
+def test_parallel_invalid_level_filter(trade):
+    with pytest.raises(ValueError, match="Invalid HTS code"):
+        trade.process_parallel(
+            level="hts", time_frame="yearly", level_filter="99", workers=2
+        )
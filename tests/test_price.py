@@ -0,0 +1,143 @@
+from datetime import datetime
+
+import polars as pl
+import pytest
+from conftest import OfflineTrade
+from polars.testing import assert_frame_equal
+
+PRICES = {"0201100000": [10, 20, 30, 40, 50, 60, 70, 80], "1004900000": [50] * 8}
+
+
+@pytest.fixture
+def priced(tmp_path) -> OfflineTrade:
+    """
+    Imports 10 kg of each code in the first month of every quarter of 2009 and
+    2010, at the prices of ``PRICES``.
+    """
+    for index in range(8):
+        year, month = 2009 + index // 4, index % 4 * 3 + 1
+        path = tmp_path / "raw" / "org" / str(year) / f"{month:02d}"
+        path.mkdir(parents=True)
+        pl.DataFrame(
+            {
+                "date": [datetime(year, month, 1)] * 2,
+                "country": ["spain"] * 2,
+                "trade_id": [1, 1],
+                "hts_code": list(PRICES),
+                "unit_1": ["kg", "kg"],
+                "qty_1": [10, 10],
+                "unit_2": [None, None],
+                "qty_2": [None, None],
+                "data": [prices[index] * 10 for prices in PRICES.values()],
+                "agri_prod": [1, 1],
+                "hts_desc": ["meat", "cereal"],
+            },
+            schema_overrides={
+                "date": pl.Datetime("us"),
+                "unit_2": pl.String,
+                "qty_2": pl.Int64,
+            },
+        ).write_parquet(path / "data.parquet")
+    return OfflineTrade(saving_dir=str(tmp_path), log_file=str(tmp_path / "log"))
+
+
+def row(df: pl.DataFrame, code: str, **period) -> dict:
+    return df.filter(
+        pl.col(df.columns[2]) == code,
+        *(pl.col(col) == value for col, value in period.items()),
+    ).row(0, named=True)
+
+
+def test_price_windows(priced):
+    df = priced.process_price(window=3)
+    assert df.columns[:3] == ["year", "qtr", "hs4"]
+
+    # Prices 10, 20, 30 in the first three quarters of 2009
+    q3 = row(df, "0201", year=2009, qtr=3)
+    assert q3["price_imports"] == 30
+    assert q3["price_imports_mean"] == pytest.approx(20)
+    assert q3["price_imports_std"] == pytest.approx(10)
+    assert q3["price_imports_upper"] == pytest.approx(40)
+    assert q3["price_imports_lower"] == pytest.approx(0)
+    assert row(df, "0201", year=2009, qtr=2)["price_imports_mean"] is None
+
+    # From 10 in 2009 Q1 to 50 in 2010 Q1
+    assert row(df, "0201", year=2010, qtr=1)["price_imports_yoy"] == pytest.approx(400)
+
+    # 0201 ranks below 1004 in 2009 Q2, ties it in 2010 Q1, and passes it in Q2
+    assert row(df, "0201", year=2009, qtr=2)["price_imports_rank"] == 2
+    assert row(df, "0201", year=2010, qtr=1)["price_imports_rank"] == 1
+    assert row(df, "1004", year=2010, qtr=1)["price_imports_rank"] == 1
+    assert row(df, "0201", year=2010, qtr=2)["price_imports_rank_yoy"] == 1
+    assert row(df, "1004", year=2010, qtr=2)["price_imports_rank_yoy"] == -1
+    assert row(df, "0201", year=2009, qtr=4)["price_imports_rank_yoy"] is None
+
+
+@pytest.mark.parametrize("grain, code", [("hs2", "02"), ("hs6", "020110")])
+def test_price_grains(priced, grain, code):
+    df = priced.process_price(grain=grain, window=2)
+    assert sorted(df[grain].unique()) == sorted(c[: int(grain[2:])] for c in PRICES)
+    # Mean of 70 and 80
+    assert row(df, code, year=2010, qtr=4)["price_imports_mean"] == pytest.approx(75)
+
+
+def test_price_monthly(priced):
+    df = priced.process_price(time_frame="monthly", window=2)
+    assert df.columns[:3] == ["year", "month", "hs4"]
+    assert df.height == 2 * 8
+    # Mean of 10 in January and 20 in April, the months holding records
+    assert row(df, "0201", year=2009, month=4)["price_imports_mean"] == pytest.approx(
+        15
+    )
+    assert row(df, "0201", year=2009, month=4)["price_imports_rank"] == 2
+
+
+@pytest.mark.parametrize("mode", ["cache", "cube"])
+def test_price_cache(priced, mode):
+    expected = priced.process_price(agriculture_filter=True)
+    result = priced.process_price(agriculture_filter=True, **{mode: True})
+    assert_frame_equal(result, expected, check_exact=False)
+
+    entries = list((priced.saving_dir / "cache" / "price").glob("*/*/prices.parquet"))
+    assert [entry.parent.parent.name for entry in entries] == ["hs4-qtr-w3-agri"]
+    assert_frame_equal(
+        priced.process_price(agriculture_filter=True, **{mode: True}), result
+    )
+
+
+def test_price_default_matches_baseline(trade):
+    """The default call keeps the columns and values of the original quarterly
+    HS4 prices."""
+    df = trade.process_int_jp(
+        time_frame="qtr", level="hts", source="org", corrections=True
+    )
+    df = df.with_columns(
+        hs4=pl.col("hts_code").str.slice(0, 4),
+        imports_qty=pl.when(pl.col("imports_qty") == 0)
+        .then(1)
+        .otherwise(pl.col("imports_qty")),
+        exports_qty=pl.when(pl.col("exports_qty") == 0)
+        .then(1)
+        .otherwise(pl.col("exports_qty")),
+    )
+    df = df.group_by(pl.col("year", "qtr", "hs4")).agg(
+        imports=pl.col("imports").sum(),
+        exports=pl.col("exports").sum(),
+        imports_qty=pl.col("imports_qty").sum(),
+        exports_qty=pl.col("exports_qty").sum(),
+    )
+    expected = (
+        df.with_columns(
+            price_imports=pl.col("imports") / pl.col("imports_qty"),
+            price_exports=pl.col("exports") / pl.col("exports_qty"),
+            date=pl.datetime(pl.col("year"), (pl.col("qtr") - 1) * 3 + 1, 1),
+        )
+        .sort(["hs4", "date"])
+        .with_columns(
+            price_imports_yoy=pl.col("price_imports").pct_change(4).over("hs4") * 100,
+            price_exports_yoy=pl.col("price_exports").pct_change(4).over("hs4") * 100,
+        )
+    )
+
+    result = trade.process_price()
+    assert_frame_equal(result.select(expected.columns), expected, check_exact=False)
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import polars as pl
+from conftest import OfflineTrade
+
+
+class BarrierTrade(OfflineTrade):
+    """Holds every pull until two calls are running at once."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.barrier = threading.Barrier(2, timeout=10)
+
+    def _pull(self, source="org") -> pl.DataFrame:
+        self.barrier.wait()
+        return super()._pull(source)
+
+
+def profiled(trade) -> list[dict]:
+    trade.profile = True
+    records = []
+    trade.hooks.append(records.append)
+    return records
+
+
+def test_concurrent_calls_get_their_own_record(saving_dir):
+    trade = BarrierTrade(saving_dir=str(saving_dir), log_file=str(saving_dir / "log"))
+    records = profiled(trade)
+    with ThreadPoolExecutor(2) as pool:
+        results = list(
+            pool.map(
+                lambda level: trade.process_int_jp(level=level, time_frame="yearly"),
+                ["hts", "country"],
+            )
+        )
+
+    assert all(isinstance(df, pl.DataFrame) for df in results)
+    assert sorted(record["params"]["level"] for record in records) == [
+        "country",
+        "hts",
+    ]
+    for record in records:
+        stages = [(stage["stage"], stage["depth"]) for stage in record["stages"]]
+        assert stages == [("conversion", 0), ("process_data", 0), ("filter_data", 1)]
+
+
+def test_lazy_stages_are_flagged(trade):
+    records = profiled(trade)
+    trade.process_int_jp(level="hts", time_frame="yearly", lazy=True)
+    trade.process_int_jp(level="hts", time_frame="yearly")
+
+    lazy, eager = ({s["stage"]: s["lazy"] for s in r["stages"]} for r in records)
+    assert lazy == {
+        "scan_int": True,
+        "conversion": True,
+        "process_data": True,
+        "filter_data": True,
+        "collect": False,
+    }
+    assert not any(eager.values())
@@ -0,0 +1,84 @@
+import shutil
+
+import polars as pl
+import pytest
+from conftest import OfflineTrade, raw_month
+from polars.testing import assert_frame_equal
+
+from jp_imports.jp_imports import CUBE_SORT_KEY
+
+
+def copy_trade(saving_dir, path) -> OfflineTrade:
+    shutil.copytree(saving_dir / "raw", path / "raw")
+    return OfflineTrade(saving_dir=str(path), log_file=str(path / "log"))
+
+
+def rewrite_month(raw_dir):
+    df = raw_month(2008, 6, "jp").with_columns(data=pl.col("data") * 2)
+    df.write_parquet(raw_dir / "2008" / "06" / "data.parquet")
+
+
+def add_month(raw_dir):
+    (raw_dir / "2013" / "01").mkdir(parents=True)
+    raw_month(2013, 1, "jp").write_parquet(raw_dir / "2013" / "01" / "data.parquet")
+
+
+def remove_month(raw_dir):
+    shutil.rmtree(raw_dir / "2008" / "06")
+
+
+def remove_year(raw_dir):
+    shutil.rmtree(raw_dir / "2012")
+
+
+def entries(trade, kind) -> list[str]:
+    return sorted(path.name for path in (trade.saving_dir / "cache" / kind).iterdir())
+
+
+@pytest.mark.parametrize(
+    "change, changed",
+    [
+        (rewrite_month, [(2008, 6)]),
+        (add_month, [(2013, 1)]),
+        (remove_month, [(2008, 6)]),
+        (remove_year, [(2012, month) for month in range(1, 13)]),
+    ],
+)
+@pytest.mark.parametrize("corrections", [False, True])
+def test_refresh_matches_rebuild(saving_dir, tmp_path, change, changed, corrections):
+    kwargs = {"source": "jp", "corrections": corrections}
+    trade = copy_trade(saving_dir, tmp_path / "refreshed")
+    assert trade.refresh(**kwargs) != []
+    assert trade.refresh(**kwargs) == []
+
+    change(trade.saving_dir / "raw" / "jp")
+    assert trade.refresh(**kwargs) == changed
+    fresh = copy_trade(trade.saving_dir, tmp_path / "fresh")
+
+    # Only the refreshed entry of the key is left in the cache
+    for kind in ["base", "cube"]:
+        current = trade._cache_entry(kind=kind, **kwargs)[1]
+        assert current.exists()
+        assert entries(trade, kind) == [current.name]
+
+    assert_frame_equal(
+        trade.base_table(**kwargs).collect(), fresh.base_table(**kwargs).collect()
+    )
+    cube, fresh_cube = trade.build_cube(**kwargs), fresh.build_cube(**kwargs)
+    assert sorted(p.name for p in cube.iterdir()) == sorted(
+        p.name for p in fresh_cube.iterdir()
+    )
+    for file in fresh_cube.glob("*.parquet"):
+        result, expected = pl.read_parquet(cube / file.name), pl.read_parquet(file)
+        if file.name == "cube.parquet":
+            # Rows tied on the sort key and month come in any order, the prefix
+            # index only relies on the sort key
+            key = pl.col(CUBE_SORT_KEY).cast(pl.String)
+            assert result.select(key.is_sorted(nulls_last=True)).item()
+            result, expected = (
+                df.with_columns(pl.col(pl.Categorical).cast(pl.String)).sort(
+                    pl.all(), nulls_last=True
+                )
+                for df in (result, expected)
+            )
+        assert_frame_equal(result, expected, check_exact=False)
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+
+import polars as pl
+import pytest
+
+from jp_imports.service import QueryService
+
+
+class StubTrade:
+    """
+    Stands in for ``JPTrade`` in the service workers. Every run is recorded and
+    waits for ``release``, the result has 25 rows per character of the
+    ``datetime`` filter and a ``"bad"`` level filter fails validation.
+    """
+
+    def __init__(
+        self, runs: list[dict], started: threading.Event, release: threading.Event
+    ):
+        self.runs = runs
+        self.started = started
+        self.release = release
+
+    def process_int_jp(self, **query) -> pl.DataFrame:
+        self.runs.append(query)
+        self.started.set()
+        self.release.wait(timeout=10)
+        if query["level_filter"] == "bad":
+            raise ValueError("Invalid HTS code: bad")
+        return pl.DataFrame({"rows": range(len(query["datetime"]) * 25)})
+
+
+class Stub:
+    def __init__(self) -> None:
+        self.runs = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def factory(self) -> StubTrade:
+        return StubTrade(self.runs, self.started, self.release)
+
+
+@pytest.fixture
+def stub() -> Stub:
+    return Stub()
+
+
+async def started_queries(
+    service: QueryService, stub: Stub, count: int, **query
+) -> list[asyncio.Task]:
+    """Starts ``count`` identical queries and waits for their run to start."""
+    stub.release.clear()
+    tasks = [
+        asyncio.create_task(service.query("hts", "yearly", **query))
+        for _ in range(count)
+    ]
+    await asyncio.to_thread(stub.started.wait, 10)
+    return tasks
+
+
+def test_identical_queries_share_one_run(stub):
+    async def main():
+        async with QueryService(stub.factory) as service:
+            tasks = await started_queries(service, stub, 5)
+            stub.release.set()
+            return service, await asyncio.gather(*tasks)
+
+    service, results = asyncio.run(main())
+    assert len(stub.runs) == 1
+    assert all(df is results[0] for df in results)
+    assert service.stats == {"hits": 0, "misses": 1, "coalesced": 4}
+
+
+def test_cache_hit(stub):
+    async def main():
+        async with QueryService(stub.factory) as service:
+            first = await service.query("hts", "yearly", datetime="2008")
+            second = await service.query("hts", "yearly", datetime="2008")
+            other = await service.query("hts", "yearly", datetime="2012")
+            return service, first, second, other
+
+    service, first, second, other = asyncio.run(main())
+    assert second is first
+    assert other is not first
+    assert len(stub.runs) == 2
+    assert service.stats == {"hits": 1, "misses": 2, "coalesced": 0}
+
+
+def test_ttl_expiry(stub):
+    now = [0.0]
+
+    async def main():
+        async with QueryService(stub.factory, ttl=10, clock=lambda: now[0]) as service:
+            await service.query("hts", "yearly")
+            now[0] = 10
+            await service.query("hts", "yearly")
+            now[0] = 10.5
+            await service.query("hts", "yearly")
+            return service
+
+    service = asyncio.run(main())
+    assert len(stub.runs) == 2
+    assert service.stats == {"hits": 1, "misses": 2, "coalesced": 0}
+
+
+@pytest.mark.parametrize(
+    "limits",
+    [
+        {"max_entries": 2},
+        # Every stub result of a 4 character filter is 100 Int64 values
+        {"max_bytes": 2 * 800},
+    ],
+)
+def test_lru_eviction(stub, limits):
+    async def main():
+        async with QueryService(stub.factory, **limits) as service:
+            for datetime in ["2007", "2008", "2007", "2012"]:
+                await service.query("hts", "yearly", datetime=datetime)
+            # 2008 was the least recently used when 2012 was cached
+            for datetime in ["2007", "2012", "2008"]:
+                await service.query("hts", "yearly", datetime=datetime)
+            return service
+
+    service = asyncio.run(main())
+    assert [run["datetime"] for run in stub.runs] == ["2007", "2008", "2012", "2008"]
+    assert len(service._cache) == 2
+    assert service._cache_bytes == 2 * 800
+
+
+def test_cancelled_waiter_keeps_shared_run(stub):
+    async def main():
+        async with QueryService(stub.factory) as service:
+            cancelled, waiting = await started_queries(service, stub, 2)
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+            stub.release.set()
+            result = await waiting
+            return service, result, await service.query("hts", "yearly")
+
+    service, result, cached = asyncio.run(main())
+    assert len(stub.runs) == 1
+    assert cached is result
+    assert service.stats == {"hits": 1, "misses": 1, "coalesced": 1}
+
+
+def test_error_reaches_every_waiter_uncached(stub):
+    async def main():
+        async with QueryService(stub.factory) as service:
+            tasks = await started_queries(service, stub, 3, level_filter="bad")
+            stub.release.set()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            with pytest.raises(ValueError):
+                await service.query("hts", "yearly", level_filter="bad")
+            return service, results
+
+    service, results = asyncio.run(main())
+    assert all(isinstance(error, ValueError) for error in results)
+    assert len(stub.runs) == 2
+    assert not service._cache
+    assert not service._inflight
@@ -0,0 +1,54 @@
+import itertools
+
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from jp_imports.jp_imports import LEVEL_GROUPS, TIME_GROUPS
+
+
+def read_sink(path) -> pl.DataFrame:
+    return pl.read_parquet(path / "**" / "*.parquet", hive_partitioning=False)
+
+
+@pytest.mark.parametrize(
+    "time_frame, level", list(itertools.product(TIME_GROUPS, LEVEL_GROUPS))
+)
+@pytest.mark.parametrize("engine", ["polars", "duckdb"])
+def test_sink_matches_eager(trade, tmp_path, time_frame, level, engine):
+    kwargs = {"level": level, "time_frame": time_frame, "source": "jp"}
+    path = trade.sink_int_jp(tmp_path / "out", engine=engine, **kwargs)
+
+    key = TIME_GROUPS[time_frame][0]
+    expected = trade.process_int_jp(**kwargs)
+    assert sorted(p.name for p in path.iterdir()) == sorted(
+        f"{key}={value}" for value in expected[key].unique()
+    )
+    result = read_sink(path).select(expected.columns)
+    keys = TIME_GROUPS[time_frame] + LEVEL_GROUPS[level]
+    assert_frame_equal(
+        result.sort(keys, nulls_last=True),
+        expected.sort(keys, nulls_last=True),
+        check_exact=False,
+    )
+
+
+@pytest.mark.parametrize("existing", ["sink", "directory"])
+def test_sink_replaces_existing_output(trade, tmp_path, existing):
+    path = tmp_path / "out"
+    if existing == "sink":
+        trade.sink_int_jp(path, level="hts", time_frame="yearly")
+    else:
+        (path / "year=1999").mkdir(parents=True)
+        (path / "year=1999" / "stale.parquet").write_bytes(b"")
+
+    trade.sink_int_jp(path, level="hts", time_frame="yearly", datetime="2008")
+
+    assert [p.name for p in path.iterdir()] == ["year=2008"]
+    expected = trade.process_int_jp(level="hts", time_frame="yearly", datetime="2008")
+    assert_frame_equal(
+        read_sink(path).select(expected.columns).sort("hts_code", nulls_last=True),
+        expected.sort("hts_code", nulls_last=True),
+    )
+    # Only the current version is left next to the output
+    assert [p for p in tmp_path.iterdir() if p.name != "out"] == [path.resolve()]